@@ -1,27 +1,268 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import sys
 import time
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
 from datetime import datetime
-from collections import Counter
-from urllib.parse import urlparse, urljoin
+from http.cookiejar import DefaultCookiePolicy
+from collections import Counter, OrderedDict, deque
+from urllib.parse import urlparse, urljoin, urlunparse, unquote, quote
 import re
-from bs4 import BeautifulSoup
+import math
 import mimetypes
 import base64
+from html.parser import HTMLParser
+import binascii
+import struct
+import threading
+import queue
+import codecs
+import uuid
+import sqlite3
+import asyncio
+import zlib
+from xml.etree import ElementTree
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 app = Flask(__name__)
 CORS(app)
 
 # Configuration
 REQUEST_TIMEOUT = 15  # seconds
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB, hard cap on a fetched page
+PROBE_MAX_WORKERS = 16  # concurrent image probes per extraction
+PROBE_MAX_PER_HOST = 4  # concurrent image probes against a single host
+CRAWL_MAX_PAGES = 50  # pages fetched by one crawl
+CRAWL_MAX_DEPTH = 3  # link hops followed from the start page
+CRAWL_MAX_CONCURRENT_PAGES = 8
+SITEMAP_MAX_URLS = 50000  # pages extracted from one sitemap run
+SITEMAP_MAX_FILES = 100  # sitemap files read per run (the index and its children)
+SITEMAP_MAX_DEPTH = 2  # levels of nested sitemap indexes followed
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024  # uncompressed bytes read per sitemap file (the protocol's own limit)
+SITEMAP_MAX_CONCURRENT_PAGES = 16
+BATCH_MAX_SITES = 500  # site URLs accepted by one batch extraction
+BATCH_MAX_CONCURRENT_SITES = 32  # sites whose pages are fetched and parsed at once
+BATCH_MAX_WORKERS = 64  # probe threads shared by all sites of a batch
+ANALYZE_MAX_IN_FLIGHT = 128  # concurrent probes in one bulk /api/analyze-images call (one blocking worker thread each)
+ANALYZE_MAX_PER_HOST = 10  # concurrent bulk probes against a single host (matches the pool size)
+POOL_MAX_HOSTS = 64  # host connection pools kept open by the shared client
+POOL_MAXSIZE_PER_HOST = 10  # keep-alive connections kept per host
+POOL_IDLE_TIMEOUT = 90  # seconds before an idle host pool is closed
+PROBE_CACHE_MAX_ENTRIES = 20000  # probe results kept in memory
+PROBE_CACHE_TTL = 3600  # seconds a cached probe is served before revalidation
+PROBE_STRATEGY_TTL = 1800  # seconds a learned per-host probe method is trusted
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive timeouts/connection errors before a host is skipped
+CIRCUIT_RESET_SECONDS = 30  # seconds a tripped host is skipped before one trial probe
+NEGATIVE_CACHE_MAX_ENTRIES = 5000
+NEGATIVE_CACHE_TTL = 60  # seconds a URL that answered 4xx/5xx is not probed again
+JOB_MAX_WORKERS = 4  # background jobs running at once
+JOB_MAX_QUEUE = 32  # queued + running jobs before new submissions are rejected
+JOB_RETENTION_SECONDS = 3600  # how long finished job results are kept
+CSS_SCAN_CACHE_SIZE = 4096  # distinct (inline style, base URL) pairs whose results are cached
+CSS_SCAN_CACHE_MAX_LENGTH = 2048  # longer CSS (e.g. <style> blocks) is scanned without caching
+FETCH_STYLESHEETS = True  # scan linked stylesheets for background images
+STYLESHEET_MAX_DEPTH = 2  # levels of @import followed from a linked stylesheet
+STYLESHEET_MAX_COUNT = 50  # stylesheets fetched per page
+STYLESHEET_POLL_INTERVAL = 0.05  # seconds between image result checks while stylesheets load
+STYLESHEET_MAX_WORKERS = 8
+STYLESHEET_MAX_BYTES = 5 * 1024 * 1024
+STYLESHEET_CACHE_MAX_ENTRIES = 2000
+STYLESHEET_CACHE_TTL = 600  # seconds before a cached stylesheet is revalidated
+PIPELINE_EXTRACTION = False  # parse the page while it downloads and probe images immediately
+PAGE_CHUNK_BYTES = 16 * 1024
+PROBE_CONNECT_TIMEOUT_MIN = 1.0  # adaptive per-host probe timeouts stay within these bounds (seconds)
+PROBE_CONNECT_TIMEOUT_MAX = 5.0
+PROBE_READ_TIMEOUT_MIN = 2.0
+PROBE_READ_TIMEOUT_MAX = REQUEST_TIMEOUT
+LATENCY_EWMA_ALPHA = 0.2  # weight of the newest response time in the per-host average
+LATENCY_WINDOW = 50  # recent response times kept per host for the tail percentile
+LATENCY_PERCENTILE = 0.95
+LATENCY_MIN_SAMPLES = 3  # hosts with fewer samples get the maximum timeouts
+LATENCY_TIMEOUT_FACTOR = 4  # timeout = factor x max(EWMA, tail percentile)
+LATENCY_MAX_HOSTS = 1000
+HOST_RATE_LIMIT = 20  # image probes per second sent to one host, shared by all requests
+HOST_RATE_BURST = 10  # probes a quiet host may receive back to back
+HOST_RATE_OVERRIDES = {}  # per-domain probes per second, e.g. {'example.com': 2} (covers subdomains)
+RATE_LIMIT_MAX_HOSTS = 1000
+SCAN_HISTORY_MAX_SITES = 1000  # previous scans kept in memory for incremental rescans
+PERSISTENT_CACHE_PATH = None  # SQLite file for probe/page caches that survive restarts, shareable by worker processes (None disables)
+PERSISTENT_CACHE_MAX_ENTRIES = 200000  # rows kept per table; the oldest are evicted beyond this
+PERSISTENT_CACHE_MAX_AGE = 7 * 24 * 3600  # seconds before the vacuum job drops a row
+PERSISTENT_CACHE_BUSY_TIMEOUT = 5  # seconds to wait for a lock held by another process
+PERSISTENT_CACHE_VACUUM_INTERVAL = 6 * 3600  # seconds between vacuum runs
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 
-def get_session():
-    """Create a requests session with headers"""
+class HostLatencyTracker:
+    """Per-host response time estimates (EWMA and a tail percentile) used to size timeouts.
+    
+    Hosts start at the maximum timeouts. Once a few responses have been seen the
+    connect and read timeouts become LATENCY_TIMEOUT_FACTOR times the slower of the
+    EWMA and the tail percentile, clamped to the configured bounds. Timeouts are
+    recorded as samples too, so a host that gets cut off earns longer timeouts.
+    """
+    
+    def __init__(self, alpha=LATENCY_EWMA_ALPHA, window=LATENCY_WINDOW, max_hosts=LATENCY_MAX_HOSTS):
+        self.alpha = alpha
+        self.window = window
+        self.max_hosts = max_hosts
+        self._hosts = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def record(self, host, seconds):
+        with self._lock:
+            estimate = self._hosts.get(host)
+            if estimate is None:
+                estimate = {'ewma': seconds, 'samples': deque(maxlen=self.window), 'count': 0}
+                self._hosts[host] = estimate
+                while len(self._hosts) > self.max_hosts:
+                    self._hosts.popitem(last=False)
+            else:
+                estimate['ewma'] += self.alpha * (seconds - estimate['ewma'])
+                self._hosts.move_to_end(host)
+            estimate['samples'].append(seconds)
+            estimate['count'] += 1
+    
+    def get_timeouts(self, host):
+        """Return the (connect, read) timeout for host"""
+        with self._lock:
+            estimate = self._hosts.get(host)
+            if estimate is None or len(estimate['samples']) < LATENCY_MIN_SAMPLES:
+                return (PROBE_CONNECT_TIMEOUT_MAX, PROBE_READ_TIMEOUT_MAX)
+            expected = max(estimate['ewma'], percentile(estimate['samples'], LATENCY_PERCENTILE))
+        expected *= LATENCY_TIMEOUT_FACTOR
+        connect = min(max(expected, PROBE_CONNECT_TIMEOUT_MIN), PROBE_CONNECT_TIMEOUT_MAX)
+        read = min(max(expected, PROBE_READ_TIMEOUT_MIN), PROBE_READ_TIMEOUT_MAX)
+        return (round(connect, 3), round(read, 3))
+    
+    def get_stats(self):
+        with self._lock:
+            hosts = list(self._hosts)
+            estimates = {host: (self._hosts[host]['ewma'], percentile(self._hosts[host]['samples'], LATENCY_PERCENTILE),
+                                self._hosts[host]['count'])
+                         for host in hosts}
+        details = {}
+        for host, (ewma, tail, count) in estimates.items():
+            connect, read = self.get_timeouts(host)
+            details[host] = {
+                'samples': count,
+                'ewmaMs': round(ewma * 1000, 1),
+                'p95Ms': round(tail * 1000, 1),
+                'connectTimeout': connect,
+                'readTimeout': read,
+            }
+        return {'trackedHosts': len(details), 'hosts': details}
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+HOST_LATENCY = HostLatencyTracker()
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that closes idle host pools and keeps connection reuse counters"""
+    
+    def __init__(self, idle_timeout=POOL_IDLE_TIMEOUT, **kwargs):
+        self.idle_timeout = idle_timeout
+        self._stats_lock = threading.Lock()
+        self._last_used = {}
+        self._last_sweep = time.monotonic()
+        self._retired = {'requests': 0, 'connections': 0, 'pools': 0}
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        
+        # Fold counters of every pool that gets closed (idle or LRU) into the totals
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+        
+        def retire_pool(pool):
+            with self._stats_lock:
+                self._retired['requests'] += pool.num_requests
+                self._retired['connections'] += pool.num_connections
+                self._retired['pools'] += 1
+            if dispose:
+                dispose(pool)
+            else:
+                pool.close()
+        
+        pools.dispose_func = retire_pool
+    
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        now = time.monotonic()
+        with self._stats_lock:
+            self._last_used[(parsed.scheme, parsed.hostname)] = now
+            sweep = now - self._last_sweep >= self.idle_timeout / 2
+            if sweep:
+                self._last_sweep = now
+        if sweep:
+            self.evict_idle_pools()
+        
+        # Time to response headers feeds the per-host timeout estimates. A timeout
+        # clamped to the caller's deadline says nothing about the host.
+        host = parsed.netloc.lower()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.exceptions.Timeout as e:
+            if is_budget_timeout(kwargs.get('timeout')):
+                raise DeadlineExceeded(f'Deadline exceeded ({e})') from e
+            HOST_LATENCY.record(host, time.monotonic() - now)
+            raise
+        HOST_LATENCY.record(host, time.monotonic() - now)
+        return response
+    
+    def evict_idle_pools(self):
+        """Close host pools that have not been used for idle_timeout seconds"""
+        cutoff = time.monotonic() - self.idle_timeout
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            host_key = (key.key_scheme, key.key_host)
+            with self._stats_lock:
+                last_used = self._last_used.get(host_key, 0)
+                if last_used >= cutoff:
+                    continue
+                self._last_used.pop(host_key, None)
+            try:
+                del pools[key]
+            except KeyError:
+                pass
+    
+    def get_stats(self):
+        """Return connection pool hit/miss counters"""
+        pools = self.poolmanager.pools
+        with pools.lock:
+            live_pools = list(pools._container.values())
+        live_requests = sum(pool.num_requests for pool in live_pools)
+        live_connections = sum(pool.num_connections for pool in live_pools)
+        
+        with self._stats_lock:
+            total_requests = self._retired['requests'] + live_requests
+            total_connections = self._retired['connections'] + live_connections
+            evicted = self._retired['pools']
+        
+        hits = max(total_requests - total_connections, 0)
+        return {
+            'openPools': len(live_pools),
+            'requests': total_requests,
+            'hits': hits,
+            'misses': total_connections,
+            'hitRate': round(hits / total_requests, 3) if total_requests else 0.0,
+            'evictedPools': evicted,
+        }
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def create_session(pool_maxsize=POOL_MAXSIZE_PER_HOST):
+    """Create a requests session with headers and a pooled keep-alive adapter"""
     session = requests.Session()
     session.headers.update({
         'User-Agent': USER_AGENT,
@@ -31,8 +272,29 @@ def get_session():
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1',
     })
+    # The session is shared by every client's scans, so it must not keep cookies
+    # (a redirect chain still carries its own cookies within one request)
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = PooledHTTPAdapter(pool_connections=POOL_MAX_HOSTS, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
     return session
 
+def get_session():
+    """Return the process-wide pooled session shared by all requests"""
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = create_session()
+    return _shared_session
+
+def get_pool_stats():
+    """Return connection pool counters of the shared session"""
+    if _shared_session is None:
+        return {'openPools': 0, 'requests': 0, 'hits': 0, 'misses': 0, 'hitRate': 0.0, 'evictedPools': 0}
+    return _shared_session.get_adapter('https://').get_stats()
+
 def is_valid_image_url(url):
     """Check if URL is a valid image URL (including base64 data: URLs) - EXACT match with network_capture.py"""
     if not url:
@@ -182,85 +444,282 @@ def format_file_size(size_bytes):
     else:
         return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
 
-def extract_images_from_html(html_content, base_url):
-    """Extract image URLs from HTML content with comprehensive search"""
-    image_urls = set()
+# Elements BeautifulSoup treats as empty, never left open
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer',
+}
+# One scanner for all CSS image references: each alternative is a named token
+CSS_SCANNER_PATTERN = re.compile(r'''
+    (?P<comment>/\*.*?\*/)
+  | (?P<property>(?<![\w-])(?:background-image|background|content|list-style-image)\s*:)
+  | (?P<end>[;{}])
+  | url\(\s*(?:"(?P<dq>(?:[^"\\]|\\.)*)"|'(?P<sq>(?:[^'\\]|\\.)*)'|(?P<bare>(?:[^"'()\s\\]|\\(?:[0-9a-fA-F]{1,6}\s?|.))+))\s*\)
+  | (?P<type>type\(\s*(?:"[^"]*"|'[^']*')\s*\))
+  | (?P<imageset>(?:-webkit-)?image-set\()
+  | "(?P<dqstr>(?:[^"\\]|\\.)*)"
+  | '(?P<sqstr>(?:[^'\\]|\\.)*)'
+''', re.IGNORECASE | re.VERBOSE | re.DOTALL)
+CSS_ESCAPE_PATTERN = re.compile(r'\\([0-9a-fA-F]{1,6}\s?|.)', re.DOTALL)
+CSS_IMPORT_PATTERN = re.compile(r'@import\s+(?:url\(\s*(?:"([^"]*)"|\'([^\']*)\'|([^)\s]*))\s*\)|"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+IMAGE_CONTAINER_CLASSES = {'image', 'img', 'photo', 'picture'}
+IMAGE_CONTAINER_ATTRS = ('data-bg', 'data-background')
+# Links to these files are not followed by a crawl
+CRAWL_SKIP_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'bmp', 'ico', 'avif', 'css', 'js', 'json', 'xml', 'pdf',
+    'zip', 'gz', 'rar', '7z', 'tar', 'mp3', 'mp4', 'webm', 'mov', 'avi', 'wav', 'woff', 'woff2', 'ttf',
+    'eot', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'exe', 'dmg', 'apk',
+}
+
+class ImageHTMLParser(HTMLParser):
+    """Single-pass tokenizer that collects image URL candidates without building a tree.
     
-    try:
-        soup = BeautifulSoup(html_content, 'html.parser')
+    Mirrors the BeautifulSoup extractor it replaced (the parity reference in
+    tests/test_html_extractor.py): img src and lazy-load attributes, source
+    srcset inside picture, <style> blocks, inline style attributes and the image
+    container patterns (.image, .img, .photo, .picture, [data-bg], [data-background]).
+    Only a stack of open tag names is kept so picture nesting matches the tree.
+    Linked and @import-ed stylesheets are collected in stylesheet_urls and
+    <a>/<area> links in link_urls (without fragments). Image URLs are deduplicated
+    by canonical_url; url_variants keeps every spelling seen.
+    """
+    
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.image_urls = {}  # ordered set of discovered URLs
+        self.stylesheet_urls = {}
+        self.link_urls = {}
+        self.url_variants = {}  # canonical URL -> every spelling of it, first one kept in image_urls
+        self.on_image_url = None  # called once per new image URL, for early dispatch
+        self._open_tags = []
+        self._picture_depth = 0
+        self._style_parts = None
+    
+    def add_image_url(self, url):
+        full_url = make_absolute_url(url, self.base_url)
+        if is_valid_image_url(full_url):
+            self.found_image_url(full_url)
+    
+    def add_css_images(self, css_content):
+        for full_url in extract_css_images(css_content, self.base_url):
+            self.found_image_url(full_url)
+    
+    def found_image_url(self, full_url):
+        key = canonical_url(full_url)
+        variants = self.url_variants.get(key)
+        if variants is not None:
+            if full_url not in variants:
+                variants.append(full_url)
+            return
+        self.url_variants[key] = [full_url]
+        self.image_urls[full_url] = None
+        if self.on_image_url is not None:
+            self.on_image_url(full_url)
+    
+    def add_stylesheet_url(self, url):
+        full_url = make_absolute_url(url.strip(), self.base_url)
+        if full_url.lower().startswith(('http://', 'https://')):
+            self.stylesheet_urls[full_url] = None
+    
+    def add_link_url(self, url):
+        full_url = make_absolute_url(url.strip(), self.base_url).split('#')[0]
+        if full_url.lower().startswith(('http://', 'https://')):
+            self.link_urls[full_url] = None
+    
+    def handle_starttag(self, tag, attrs):
+        # Repeated attributes keep the last value and valueless ones are empty, like BeautifulSoup
+        attrs = {name: value or '' for name, value in attrs}
+        
+        if tag == 'link':
+            if 'stylesheet' in attrs.get('rel', '').lower().split() and attrs.get('href'):
+                self.add_stylesheet_url(attrs['href'])
+        
+        elif tag in ('a', 'area'):
+            if attrs.get('href'):
+                self.add_link_url(attrs['href'])
         
-        # Find all img tags with src and data-src
-        img_tags = soup.find_all('img')
-        for img in img_tags:
+        elif tag == 'img':
             # Regular src attribute
-            src = img.get('src')
-            if src:
-                full_url = make_absolute_url(src, base_url)
-                if is_valid_image_url(full_url):
-                    image_urls.add(full_url)
+            if attrs.get('src'):
+                self.add_image_url(attrs['src'])
             
             # Lazy loading attributes
-            for attr in ['data-src', 'data-lazy-src', 'data-original', 'data-srcset']:
-                data_src = img.get(attr)
-                if data_src:
-                    # Handle srcset format (multiple URLs)
-                    if 'srcset' in attr:
-                        urls = parse_srcset(data_src)
-                        for url in urls:
-                            full_url = make_absolute_url(url, base_url)
-                            if is_valid_image_url(full_url):
-                                image_urls.add(full_url)
-                    else:
-                        full_url = make_absolute_url(data_src, base_url)
-                        if is_valid_image_url(full_url):
-                            image_urls.add(full_url)
-        
-        # Find picture elements with source tags
-        picture_tags = soup.find_all('picture')
-        for picture in picture_tags:
-            sources = picture.find_all('source')
-            for source in sources:
-                srcset = source.get('srcset')
-                if srcset:
-                    urls = parse_srcset(srcset)
-                    for url in urls:
-                        full_url = make_absolute_url(url, base_url)
-                        if is_valid_image_url(full_url):
-                            image_urls.add(full_url)
-        
-        # Find CSS background images in style tags
-        style_tags = soup.find_all('style')
-        for style in style_tags:
-            if style.string:
-                css_images = extract_css_images(style.string, base_url)
-                image_urls.update(css_images)
-        
-        # Find inline style background images
-        elements_with_style = soup.find_all(attrs={'style': True})
-        for element in elements_with_style:
-            style = element.get('style', '')
-            css_images = extract_css_images(style, base_url)
-            image_urls.update(css_images)
-        
-        # Look for common image container patterns
-        for selector in ['.image', '.img', '.photo', '.picture', '[data-bg]', '[data-background]']:
-            try:
-                elements = soup.select(selector)
-                for element in elements:
-                    for attr in element.attrs:
-                        if 'src' in attr or 'url' in attr or 'image' in attr:
-                            value = element.get(attr)
-                            if value and isinstance(value, str):
-                                full_url = make_absolute_url(value, base_url)
-                                if is_valid_image_url(full_url):
-                                    image_urls.add(full_url)
-            except:
-                continue
+            for attr in ['data-src', 'data-lazy-src', 'data-original']:
+                if attrs.get(attr):
+                    self.add_image_url(attrs[attr])
+            if attrs.get('data-srcset'):
+                for url in parse_srcset(attrs['data-srcset']):
+                    self.add_image_url(url)
+        
+        elif tag == 'source' and self._picture_depth and attrs.get('srcset'):
+            for url in parse_srcset(attrs['srcset']):
+                self.add_image_url(url)
         
+        # Inline style background images
+        if 'style' in attrs:
+            self.add_css_images(attrs['style'])
+        
+        # Common image container patterns
+        classes = attrs.get('class', '').split()
+        if (any(name in IMAGE_CONTAINER_CLASSES for name in classes) or
+                any(attr in attrs for attr in IMAGE_CONTAINER_ATTRS)):
+            for attr, value in attrs.items():
+                if attr != 'class' and value and ('src' in attr or 'url' in attr or 'image' in attr):
+                    self.add_image_url(value)
+        
+        if tag == 'style':
+            self._style_parts = []
+        
+        if tag not in VOID_ELEMENTS:
+            self._open_tags.append(tag)
+            if tag == 'picture':
+                self._picture_depth += 1
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        if tag == 'style':
+            self.flush_style()
+        
+        # Close back to the matching open tag; stray end tags are ignored
+        if tag not in self._open_tags:
+            return
+        while self._open_tags:
+            open_tag = self._open_tags.pop()
+            if open_tag == 'picture':
+                self._picture_depth -= 1
+            if open_tag == tag:
+                break
+    
+    def handle_data(self, data):
+        if self._style_parts is not None:
+            self._style_parts.append(data)
+    
+    def flush_style(self):
+        if self._style_parts:
+            css_content = ''.join(self._style_parts)
+            self.add_css_images(css_content)
+            for import_url in extract_css_imports(css_content):
+                self.add_stylesheet_url(import_url)
+        self._style_parts = None
+    
+    def close(self):
+        super().close()
+        # An unterminated <style> still holds its CSS
+        self.flush_style()
+
+def extract_images_from_html(html_content, base_url):
+    """Extract image URLs from HTML content in a single tokenizer pass"""
+    image_urls, _ = parse_html_resources(html_content, base_url)
+    return image_urls
+
+def parse_html_resources(html_content, base_url):
+    """Parse HTML once, returning (image_urls, stylesheet_urls)"""
+    parser = ImageHTMLParser(base_url)
+    
+    try:
+        parser.feed(html_content)
+        parser.close()
     except Exception as e:
         print(f"Error parsing HTML: {str(e)}")
     
-    return list(image_urls)
+    return list(parser.image_urls), list(parser.stylesheet_urls)
+
+def extract_css_imports(css_content):
+    """Extract the URLs of @import rules from CSS content"""
+    imports = []
+    for match in CSS_IMPORT_PATTERN.finditer(css_content):
+        url = next((group for group in match.groups() if group), None)
+        if url:
+            imports.append(url)
+    return imports
+
+def fetch_stylesheet_images(stylesheet_urls, session, max_depth=None, deadline=None):
+    """Fetch linked stylesheets concurrently, following @import up to max_depth levels,
+    and return the image URLs referenced from them (resolved against each stylesheet).
+    
+    At most STYLESHEET_MAX_COUNT stylesheets are fetched, linked and imported ones together.
+    """
+    if max_depth is None:
+        max_depth = STYLESHEET_MAX_DEPTH
+    
+    image_urls = set()
+    seen = set()
+    level = []
+    for css_url in stylesheet_urls:
+        if css_url not in seen and len(seen) < STYLESHEET_MAX_COUNT:
+            seen.add(css_url)
+            level.append(css_url)
+    if len(level) < len(set(stylesheet_urls)):
+        print(f"Page links more than {STYLESHEET_MAX_COUNT} stylesheets, the rest are skipped")
+    
+    depth = 0
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=STYLESHEET_MAX_WORKERS) as executor:
+        while level and depth <= max_depth and not (deadline and deadline.expired()):
+            next_level = []
+            fetched += len(level)
+            for entry in executor.map(lambda css_url: get_stylesheet(css_url, session, deadline), level):
+                if entry is None:
+                    continue
+                image_urls.update(entry['imageUrls'])
+                for import_url in entry['imports']:
+                    if import_url not in seen and len(seen) < STYLESHEET_MAX_COUNT:
+                        seen.add(import_url)
+                        next_level.append(import_url)
+            level = next_level
+            depth += 1
+    
+    print(f"Scanned {fetched} stylesheets: {len(image_urls)} image URLs")
+    return image_urls
+
+def get_stylesheet(css_url, session, deadline=None):
+    """Get the image URLs and @import URLs of a stylesheet through the stylesheet cache.
+    
+    Stale entries are revalidated with their ETag / Last-Modified, so shared CSS
+    bundles are only downloaded again when they change.
+    """
+    cache_key = canonical_url(css_url)
+    entry = STYLESHEET_CACHE.get(cache_key)
+    if entry is not None and STYLESHEET_CACHE.is_fresh(entry):
+        return entry['info']
+    
+    headers = {'Accept': 'text/css,*/*;q=0.1'}
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['lastModified']:
+            headers['If-Modified-Since'] = entry['lastModified']
+    
+    try:
+        response = session.get(css_url, timeout=budget_timeout(REQUEST_TIMEOUT, deadline), headers=headers, stream=True)
+        if entry is not None and response.status_code == 304:
+            response.close()
+            STYLESHEET_CACHE.refresh(cache_key)
+            return entry['info']
+        if response.status_code >= 400:
+            response.close()
+            return None
+        
+        data, complete = read_probe_body(response, STYLESHEET_MAX_BYTES)
+        if not complete:
+            print(f"Stylesheet truncated at {STYLESHEET_MAX_BYTES} bytes: {css_url[:60]}")
+        css_content = data.decode(response.encoding or 'utf-8', 'replace')
+    except (requests.exceptions.RequestException, LookupError) as e:
+        print(f"Error fetching stylesheet {css_url[:60]}: {str(e)}")
+        return None
+    
+    info = {
+        'imageUrls': tuple(extract_css_images(css_content, response.url)),
+        'imports': tuple(make_absolute_url(url.strip(), response.url) for url in extract_css_imports(css_content)),
+    }
+    STYLESHEET_CACHE.put(cache_key, info, response.headers)
+    return info
 
 def make_absolute_url(url, base_url):
     """Convert relative URL to absolute URL"""
@@ -271,9 +730,10 @@ def make_absolute_url(url, base_url):
     if url.startswith(('http://', 'https://', 'data:')):
         return url
     
-    # Protocol-relative URL
+    # Protocol-relative URL, with the page's scheme
     if url.startswith('//'):
-        return 'https:' + url
+        scheme = urlparse(base_url).scheme.lower() if base_url else ''
+        return (scheme if scheme in DEFAULT_PORTS else 'https') + ':' + url
     
     # Absolute path
     if url.startswith('/'):
@@ -299,33 +759,766 @@ def parse_srcset(srcset):
 
 def extract_css_images(css_content, base_url):
     """Extract image URLs from CSS content"""
+    if len(css_content) <= CSS_SCAN_CACHE_MAX_LENGTH:
+        # Inline styles repeat a lot (e.g. the same background on every card)
+        return set(extract_css_images_cached(css_content, base_url))
+    return resolve_css_urls(scan_css_urls(css_content), base_url)
+
+@lru_cache(maxsize=CSS_SCAN_CACHE_SIZE)
+def extract_css_images_cached(css_content, base_url):
+    return frozenset(resolve_css_urls(scan_css_urls(css_content), base_url))
+
+def resolve_css_urls(raw_urls, base_url):
+    """Make raw CSS URLs absolute and keep the valid image URLs"""
     image_urls = set()
+    for raw_url in raw_urls:
+        full_url = make_absolute_url(raw_url, base_url)
+        if is_valid_image_url(full_url):
+            image_urls.add(full_url)
+    return image_urls
+
+def scan_css_urls(css_content):
+    """Find image URLs in background, background-image, content and list-style-image
+    declarations in one pass over the CSS.
     
-    # Find all url() patterns in CSS
-    url_patterns = [
-        r'background-image:\s*url\(["\']?([^"\'()]+)["\']?\)',
-        r'background:\s*[^;]*url\(["\']?([^"\'()]+)["\']?\)',
-        r'content:\s*url\(["\']?([^"\'()]+)["\']?\)',
-        r'list-style-image:\s*url\(["\']?([^"\'()]+)["\']?\)',
-    ]
+    Handles several url() layers per declaration, quoted and escaped URLs and
+    image-set() candidates. Returns the raw (unresolved) URLs in order.
+    """
+    urls = []
+    in_image_declaration = False
+    in_image_set = False
     
-    for pattern in url_patterns:
-        matches = re.findall(pattern, css_content, re.IGNORECASE)
-        for match in matches:
-            full_url = make_absolute_url(match.strip(), base_url)
-            if is_valid_image_url(full_url):
-                image_urls.add(full_url)
+    for match in CSS_SCANNER_PATTERN.finditer(css_content):
+        kind = match.lastgroup
+        if kind == 'property':
+            in_image_declaration = True
+            in_image_set = False
+        elif kind == 'end':
+            in_image_declaration = False
+            in_image_set = False
+        elif not in_image_declaration:
+            continue
+        elif kind == 'imageset':
+            in_image_set = True
+        elif kind in ('dq', 'sq', 'bare'):
+            url = css_unescape(match.group(kind)).strip()
+            if url:
+                urls.append(url)
+        elif kind in ('dqstr', 'sqstr') and in_image_set:
+            # image-set("a.png" 1x) candidates may be plain strings
+            url = css_unescape(match.group(kind)).strip()
+            if url:
+                urls.append(url)
     
-    return image_urls
+    return tuple(urls)
+
+def css_unescape(value):
+    """Resolve CSS backslash escapes (\\" and hex escapes like \\28)"""
+    if '\\' not in value:
+        return value
+    
+    def replace(match):
+        escaped = match.group(1)
+        if escaped[0] in '0123456789abcdefABCDEF':
+            try:
+                return chr(int(escaped.strip(), 16))
+            except (ValueError, OverflowError):
+                return ''
+        return escaped
+    
+    return CSS_ESCAPE_PATTERN.sub(replace, value)
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of starting a request once the request budget is used up"""
+
+class Deadline:
+    """Overall time budget shared by every stage of one API request"""
+    
+    def __init__(self, budget_ms=None):
+        self.budget_ms = budget_ms
+        self.expires_at = time.monotonic() + budget_ms / 1000 if budget_ms else None
+    
+    @classmethod
+    def from_options(cls, options):
+        """Build from a deadline_ms option (missing or invalid means no deadline)"""
+        try:
+            budget_ms = float(options.get('deadline_ms') or 0)
+        except (TypeError, ValueError):
+            budget_ms = 0
+        return cls(budget_ms if budget_ms > 0 else None)
+    
+    def remaining(self):
+        """Seconds left, or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0)
+    
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+def int_option(value, default, maximum, minimum=1):
+    """Parse a client-supplied count option, capped at maximum.
+    
+    Missing or invalid values, and values below minimum, mean default (like
+    Deadline.from_options), so a bad option never fails the request.
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return min(number, maximum) if number >= minimum else default
+
+class BudgetTimeout(float):
+    """A timeout cut down to what is left of the deadline: when it fires, the deadline ran out"""
+
+def budget_timeout(timeout, deadline=None):
+    """Clamp a request timeout (seconds or a (connect, read) tuple) to what is left of the deadline.
+    
+    Clamped values are BudgetTimeouts, so a timeout they cause is reported as
+    DeadlineExceeded rather than blamed on the host (see PooledHTTPAdapter.send).
+    """
+    if deadline is None:
+        return timeout
+    remaining = deadline.remaining()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded')
+    if isinstance(timeout, tuple):
+        return tuple(part if part <= remaining else BudgetTimeout(remaining) for part in timeout)
+    return timeout if timeout <= remaining else BudgetTimeout(remaining)
+
+def is_budget_timeout(timeout):
+    """Check whether budget_timeout clamped timeout (or part of it) to a deadline"""
+    if isinstance(timeout, tuple):
+        return any(isinstance(part, BudgetTimeout) for part in timeout)
+    return isinstance(timeout, BudgetTimeout)
+
+def probe_timeout(url):
+    """Adaptive (connect, read) timeout for an image probe"""
+    return HOST_LATENCY.get_timeouts(urlparse(url).netloc.lower())
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+    
+    The first caller (the leader) runs the function; callers arriving while it
+    runs wait and get the same result or exception. Nothing is cached once the
+    call finishes.
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'shared': 0}
+    
+    def do(self, key, fn, deadline=None, detach=False):
+        """Run fn() once per key at a time, returning (result, shared).
+        
+        Waiting callers give up with DeadlineExceeded when deadline runs out first.
+        With detach a leader that has a deadline runs fn() on its own thread and
+        waits for it like any other caller, so fn() is never bound to one caller's
+        budget and the rest still get its result.
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+            else:
+                self._stats['shared'] += 1
+        
+        if leader:
+            if not detach or deadline is None or deadline.remaining() is None:
+                self._run(key, call, fn)
+                if call['error'] is not None:
+                    raise call['error']
+                return call['result'], False
+            threading.Thread(target=self._run, args=(key, call, fn), name='singleflight', daemon=True).start()
+        
+        timeout = deadline.remaining() if deadline is not None else None
+        if not call['done'].wait(timeout):
+            raise DeadlineExceeded('Deadline exceeded')
+        if call['error'] is not None:
+            raise call['error']
+        return call['result'], not leader
+    
+    def _run(self, key, call, fn):
+        try:
+            call['result'] = fn()
+        except BaseException as e:
+            call['error'] = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+    
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, inFlight=len(self._calls))
+
+PROBE_FLIGHTS = SingleFlight()
+EXTRACTION_FLIGHTS = SingleFlight()
+
+class ProbeCache:
+    """Thread-safe LRU cache of probe results (images, stylesheets) with a TTL and validators"""
+    
+    def __init__(self, max_entries=PROBE_CACHE_MAX_ENTRIES, ttl=PROBE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'revalidated': 0, 'evictions': 0}
+    
+    def get(self, key):
+        """Return the entry for key (fresh or stale) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            if time.time() - entry['storedAt'] < self.ttl:
+                self._stats['hits'] += 1
+            else:
+                self._stats['stale'] += 1
+            return entry
+    
+    def is_fresh(self, entry):
+        return time.time() - entry['storedAt'] < self.ttl
+    
+    def has_fresh(self, key, sniff_dimensions=False):
+        """Check for a fresh entry without touching LRU order or counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or (sniff_dimensions and 'sniffedType' not in entry['info']):
+            return False
+        return self.is_fresh(entry)
+    
+    def put(self, key, info, headers=None):
+        headers = headers or {}
+        entry = {
+            'info': dict(info),
+            'etag': headers.get('etag'),
+            'lastModified': headers.get('last-modified'),
+            'storedAt': time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def load(self, key, entry):
+        """Insert an entry from another cache layer, keeping its timestamps"""
+        with self._lock:
+            self._entries[key] = dict(entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def refresh(self, key):
+        """Mark an entry as fresh again after a 304 Not Modified"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['storedAt'] = time.time()
+                self._stats['revalidated'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxEntries=self.max_entries, ttl=self.ttl)
+
+PROBE_CACHE = ProbeCache()
+# Failed probes (4xx/5xx) are remembered briefly so repeated scans don't re-probe them
+NEGATIVE_CACHE = ProbeCache(max_entries=NEGATIVE_CACHE_MAX_ENTRIES, ttl=NEGATIVE_CACHE_TTL)
+STYLESHEET_CACHE = ProbeCache(max_entries=STYLESHEET_CACHE_MAX_ENTRIES, ttl=STYLESHEET_CACHE_TTL)
+
+class PersistentCache:
+    """SQLite-backed second cache layer for probe results, page image URL lists and site scans.
+    
+    Runs in WAL mode with a busy timeout so several worker processes on one host
+    can share the file. Rows carry validators (ETag, Last-Modified) and a storedAt
+    timestamp; tables are bounded to max_entries rows (oldest evicted first) and a
+    vacuum job drops rows older than max_age. SQLite errors never fail a request,
+    they only turn into cache misses.
+    """
+    
+    EVICT_EVERY = 500  # writes between size checks
+    
+    def __init__(self, path, max_entries=PERSISTENT_CACHE_MAX_ENTRIES, max_age=PERSISTENT_CACHE_MAX_AGE,
+                 busy_timeout=PERSISTENT_CACHE_BUSY_TIMEOUT):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0, 'vacuums': 0}
+        self._vacuum_thread = None
+        
+        conn = self.connect()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS probes (
+                key TEXT PRIMARY KEY, info TEXT NOT NULL, etag TEXT, last_modified TEXT, stored_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS probes_stored_at ON probes (stored_at)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY, image_urls TEXT NOT NULL, stylesheet_urls TEXT NOT NULL,
+                etag TEXT, last_modified TEXT, stored_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_stored_at ON pages (stored_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS scans (key TEXT PRIMARY KEY, scan TEXT NOT NULL, stored_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS scans_stored_at ON scans (stored_at)")
+    
+    def connect(self):
+        """Return this thread's connection (sqlite3 connections are not shared between threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+    
+    def query(self, sql, params=()):
+        try:
+            row = self.connect().execute(sql, params).fetchone()
+        except sqlite3.Error as e:
+            print(f"Persistent cache read failed: {str(e)}")
+            self.count('errors')
+            return None
+        self.count('hits' if row is not None else 'misses')
+        return row
+    
+    def write(self, table, sql, params=()):
+        try:
+            conn = self.connect()
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"Persistent cache write failed: {str(e)}")
+            self.count('errors')
+            return
+        with self._lock:
+            self._stats['writes'] += 1
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict(table)
+    
+    def get_probe(self, key):
+        """Return a probe entry shaped like a ProbeCache entry, or None"""
+        row = self.query("SELECT info, etag, last_modified, stored_at FROM probes WHERE key = ?", (key,))
+        if row is None:
+            return None
+        return {'info': json.loads(row[0]), 'etag': row[1], 'lastModified': row[2], 'storedAt': row[3]}
+    
+    def put_probe(self, key, info, headers=None):
+        headers = headers or {}
+        self.write('probes', "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                   (key, json.dumps(info), headers.get('etag'), headers.get('last-modified'), time.time()))
+    
+    def refresh_probe(self, key):
+        self.write('probes', "UPDATE probes SET stored_at = ? WHERE key = ?", (time.time(), key))
+    
+    def get_page(self, key):
+        """Return {'imageUrls', 'stylesheetUrls', 'etag', 'lastModified', 'storedAt'} or None"""
+        row = self.query("SELECT image_urls, stylesheet_urls, etag, last_modified, stored_at FROM pages WHERE key = ?",
+                         (key,))
+        if row is None:
+            return None
+        return {'imageUrls': json.loads(row[0]), 'stylesheetUrls': json.loads(row[1]),
+                'etag': row[2], 'lastModified': row[3], 'storedAt': row[4]}
+    
+    def put_page(self, key, image_urls, stylesheet_urls, headers=None):
+        headers = headers or {}
+        self.write('pages', "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                   (key, json.dumps(list(image_urls)), json.dumps(list(stylesheet_urls)),
+                    headers.get('etag'), headers.get('last-modified'), time.time()))
+    
+    def refresh_page(self, key):
+        self.write('pages', "UPDATE pages SET stored_at = ? WHERE key = ?", (time.time(), key))
+    
+    def get_scan(self, key):
+        """Return the last recorded scan of a site, or None"""
+        row = self.query("SELECT scan FROM scans WHERE key = ?", (key,))
+        return json.loads(row[0]) if row is not None else None
+    
+    def put_scan(self, key, scan):
+        self.write('scans', "INSERT OR REPLACE INTO scans VALUES (?, ?, ?)", (key, json.dumps(scan), scan['storedAt']))
+    
+    def evict(self, table):
+        """Delete the oldest rows of table beyond max_entries"""
+        try:
+            conn = self.connect()
+            with conn:
+                cursor = conn.execute(
+                    f"DELETE FROM {table} WHERE key IN (SELECT key FROM {table} ORDER BY stored_at "
+                    f"LIMIT MAX((SELECT COUNT(*) FROM {table}) - ?, 0))",
+                    (self.max_entries,))
+            self.count('evictions', cursor.rowcount)
+        except sqlite3.Error as e:
+            print(f"Persistent cache eviction failed: {str(e)}")
+            self.count('errors')
+    
+    def vacuum(self):
+        """Drop rows older than max_age, enforce the size bound and compact the file"""
+        try:
+            conn = self.connect()
+            cutoff = time.time() - self.max_age
+            with conn:
+                for table in ('probes', 'pages', 'scans'):
+                    cursor = conn.execute(f"DELETE FROM {table} WHERE stored_at < ?", (cutoff,))
+                    self.count('evictions', cursor.rowcount)
+            for table in ('probes', 'pages', 'scans'):
+                self.evict(table)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+            self.count('vacuums')
+        except sqlite3.Error as e:
+            # Another process holding a lock just postpones the vacuum to the next run
+            print(f"Persistent cache vacuum failed: {str(e)}")
+            self.count('errors')
+    
+    def start_vacuum_job(self, interval=PERSISTENT_CACHE_VACUUM_INTERVAL):
+        """Run vacuum every interval seconds on a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.vacuum()
+        
+        if self._vacuum_thread is None:
+            self._vacuum_thread = threading.Thread(target=run, name='cache-vacuum', daemon=True)
+            self._vacuum_thread.start()
+    
+    def get_stats(self):
+        rows = {}
+        for table in ('probes', 'pages', 'scans'):
+            try:
+                rows[table] = self.connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except sqlite3.Error:
+                rows[table] = None
+        with self._lock:
+            return dict(self._stats, rows=rows, path=self.path, maxEntries=self.max_entries, maxAge=self.max_age)
+
+PERSISTENT_CACHE = None
+if PERSISTENT_CACHE_PATH:
+    PERSISTENT_CACHE = PersistentCache(PERSISTENT_CACHE_PATH)
+    PERSISTENT_CACHE.start_vacuum_job()
+
+def store_probe_result(cache_key, img_info, headers=None):
+    """Cache a successful probe in memory and, when enabled, on disk"""
+    PROBE_CACHE.put(cache_key, img_info, headers)
+    if PERSISTENT_CACHE is not None:
+        PERSISTENT_CACHE.put_probe(cache_key, img_info, headers)
+
+def refresh_probe_result(cache_key):
+    """Mark a cached probe fresh again after a 304 Not Modified"""
+    PROBE_CACHE.refresh(cache_key)
+    if PERSISTENT_CACHE is not None:
+        PERSISTENT_CACHE.refresh_probe(cache_key)
+
+class ScanHistory:
+    """Last extraction of each site, kept for incremental rescans (also on disk when enabled)"""
+    
+    def __init__(self, max_sites=SCAN_HISTORY_MAX_SITES):
+        self.max_sites = max_sites
+        self._scans = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            scan = self._scans.get(key)
+            if scan is not None:
+                self._scans.move_to_end(key)
+                return scan
+        if PERSISTENT_CACHE is None:
+            return None
+        scan = PERSISTENT_CACHE.get_scan(key)
+        if scan is not None:
+            self.remember(key, scan)
+        return scan
+    
+    def put(self, key, scan):
+        self.remember(key, scan)
+        if PERSISTENT_CACHE is not None:
+            PERSISTENT_CACHE.put_scan(key, scan)
+    
+    def remember(self, key, scan):
+        with self._lock:
+            self._scans[key] = scan
+            self._scans.move_to_end(key)
+            while len(self._scans) > self.max_sites:
+                self._scans.popitem(last=False)
+    
+    def get_stats(self):
+        with self._lock:
+            return {'sites': len(self._scans), 'maxSites': self.max_sites}
+
+SCAN_HISTORY = ScanHistory()
+
+# Probe methods in fallback order
+PROBE_METHODS = ('head', 'range', 'get')
+# HEAD responses that mean the host refuses HEAD rather than the URL being missing
+HEAD_REJECTED_STATUSES = (403, 405, 501)
+# Bytes read from a GET probe before the connection is closed
+PROBE_READ_BYTES = 1024
+# Bytes read from a GET when sniffing image dimensions
+SNIFF_MAX_BYTES = 64 * 1024
+SNIFF_CHUNK_BYTES = 4096
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+SVG_ATTR_PATTERN = re.compile(r'([A-Za-z:-]+)\s*=\s*["\']([^"\']*)["\']')
+CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(?:\d+-\d+|\*)/(\d+)$', re.IGNORECASE)
+# What may come before the root <svg> tag: XML declaration/processing instructions, comments, an SVG doctype
+SVG_PROLOG_PATTERN = re.compile(r'\s*(?:<\?.*?\?>|<!--.*?-->|<!DOCTYPE\s+svg\b[^\[>]*(?:\[.*?\])?\s*>)',
+                                re.IGNORECASE | re.DOTALL)
+# MIME types of sniffed image formats
+SNIFFED_MIME_TYPES = {
+    'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp', 'jpg': 'image/jpeg', 'avif': 'image/avif',
+    'heic': 'image/heic', 'bmp': 'image/bmp', 'ico': 'image/x-icon', 'svg': 'image/svg+xml',
+}
+# URL canonicalization (RFC 3986 unreserved characters and the sub-delims kept as-is)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+URL_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+URL_PATH_SAFE = "%/:@!$&'()*+,;=-._~"
+URL_QUERY_SAFE = "%/?:@!$'()*+,;=-._~"
+PERCENT_ESCAPE_PATTERN = re.compile(r'%([0-9A-Fa-f]{2})')
+
+def canonical_url(url):
+    """Canonical form of a URL, used as its key for deduplication and caching.
+    
+    http and https map to the same key; host case, default ports, user info and the
+    fragment are dropped, percent-encoding is normalized (unreserved characters
+    decoded, other escapes upper-cased) and query parameters are sorted. Non-HTTP
+    URLs such as data: are returned unchanged.
+    """
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return url
+    scheme = parsed.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+    host = (parsed.hostname or '').lower()
+    if ':' in host:
+        host = f"[{host}]"
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    path = normalize_percent_encoding(parsed.path or '/', URL_PATH_SAFE)
+    params = sorted(normalize_percent_encoding(param, URL_QUERY_SAFE) for param in parsed.query.split('&') if param)
+    return urlunparse(('https', host, path, parsed.params, '&'.join(params), ''))
+
+def normalize_percent_encoding(component, safe):
+    """Escape raw unsafe characters, decode escaped unreserved ones and upper-case the rest"""
+    def replace(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in URL_UNRESERVED else '%' + match.group(1).upper()
+    return PERCENT_ESCAPE_PATTERN.sub(replace, quote(component, safe=safe))
+
+class HostProbeStrategy:
+    """Per-host memory of the first probe method (HEAD, Range GET, GET) that worked"""
+    
+    def __init__(self, ttl=PROBE_STRATEGY_TTL):
+        self.ttl = ttl
+        self._methods = {}
+        self._lock = threading.Lock()
+        self._stats = {'learnedProbes': 0, 'roundTripsSaved': 0}
+    
+    def get(self, host):
+        """Return the learned method for host, or None if unknown or expired"""
+        with self._lock:
+            learned = self._methods.get(host)
+            if learned is None:
+                return None
+            method, expires_at = learned
+            if time.time() >= expires_at:
+                del self._methods[host]
+                return None
+            return method
+    
+    def record(self, host, method):
+        with self._lock:
+            self._methods[host] = (method, time.time() + self.ttl)
+    
+    def record_saved(self, round_trips):
+        with self._lock:
+            self._stats['learnedProbes'] += 1
+            self._stats['roundTripsSaved'] += round_trips
+    
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            methods = Counter(method for method, expires_at in self._methods.values() if expires_at > now)
+            return dict(self._stats, hosts=sum(methods.values()), methods=dict(methods), ttl=self.ttl)
+
+PROBE_STRATEGY = HostProbeStrategy()
+
+class HostCircuitBreaker:
+    """Per-host circuit breaker for image probes.
+    
+    After failure_threshold consecutive timeouts or connection errors the host is
+    open: probes fail fast without touching the network. Once reset_seconds have
+    passed a single trial probe is let through (half-open); success closes the
+    circuit again, failure re-opens it.
+    """
+    
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'shortCircuited': 0}
+    
+    def is_open(self, host):
+        """Check whether a probe against host would be rejected, without claiming the trial"""
+        with self._lock:
+            circuit = self._hosts.get(host)
+            return (circuit is not None and circuit['openedAt'] is not None
+                    and time.time() - circuit['openedAt'] < self.reset_seconds)
+    
+    def allow(self, host):
+        """Return True if a probe against host may go out (claims the half-open trial)"""
+        with self._lock:
+            circuit = self._hosts.get(host)
+            if circuit is None or circuit['openedAt'] is None:
+                return True
+            if time.time() - circuit['openedAt'] >= self.reset_seconds:
+                # Re-arm the timer so only this probe goes out; a trial that never
+                # reports back simply lets another one through after reset_seconds
+                circuit['openedAt'] = time.time()
+                circuit['trial'] = True
+                return True
+            self._stats['shortCircuited'] += 1
+            return False
+    
+    def record_success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+    
+    def record_failure(self, host):
+        with self._lock:
+            circuit = self._hosts.setdefault(host, {'failures': 0, 'openedAt': None, 'trial': False})
+            circuit['failures'] += 1
+            if circuit['trial'] or (circuit['openedAt'] is None and circuit['failures'] >= self.failure_threshold):
+                circuit['openedAt'] = time.time()
+                circuit['trial'] = False
+                self._stats['opened'] += 1
+    
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            open_hosts = sorted(host for host, circuit in self._hosts.items()
+                                if circuit['openedAt'] is not None and now - circuit['openedAt'] < self.reset_seconds)
+            return dict(self._stats, openHosts=open_hosts, trackedHosts=len(self._hosts),
+                        failureThreshold=self.failure_threshold, resetSeconds=self.reset_seconds)
 
-def get_image_info_detailed(url, session):
-    """Get detailed image information similar to network_capture.py"""
+HOST_CIRCUITS = HostCircuitBreaker()
+
+class HostRateLimiter:
+    """Process-wide per-host token buckets that pace image probes.
+    
+    Each host gets rate probes per second with bursts of up to burst; different
+    hosts never wait on each other. Domains in overrides (and their subdomains)
+    use their own rate.
+    """
+    
+    def __init__(self, rate=HOST_RATE_LIMIT, burst=HOST_RATE_BURST, overrides=None, max_hosts=RATE_LIMIT_MAX_HOSTS):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = {domain.lower(): value for domain, value in (overrides or {}).items()}
+        self.max_hosts = max_hosts
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'throttled': 0, 'waitedSeconds': 0.0}
+    
+    def get_rate(self, host):
+        """Return the probe rate for host (port ignored), checking parent domains for overrides"""
+        hostname = host.rsplit(':', 1)[0] if not host.endswith(']') else host
+        labels = hostname.split('.')
+        for i in range(len(labels)):
+            domain = '.'.join(labels[i:])
+            if domain in self.overrides:
+                return self.overrides[domain]
+        return self.rate
+    
+    def acquire(self, host):
+        """Wait for a probe token for host"""
+        rate = self.get_rate(host)
+        burst = max(self.burst, 1)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = {'tokens': burst, 'updatedAt': now}
+                self._buckets[host] = bucket
+                while len(self._buckets) > self.max_hosts:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(host)
+            bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['updatedAt']) * rate)
+            bucket['updatedAt'] = now
+            
+            # Tokens may go negative: each waiter reserves its slot in line
+            wait = max(1 - bucket['tokens'], 0) / rate
+            bucket['tokens'] -= 1
+            self._stats['acquired'] += 1
+            if wait:
+                self._stats['throttled'] += 1
+                self._stats['waitedSeconds'] += wait
+        
+        if wait:
+            time.sleep(wait)
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats, hosts=len(self._buckets))
+        stats['waitedSeconds'] = round(stats['waitedSeconds'], 3)
+        return dict(stats, rate=self.rate, burst=self.burst, overrides=dict(self.overrides))
+
+HOST_RATE_LIMITER = HostRateLimiter(overrides=HOST_RATE_OVERRIDES)
+
+def is_host_failure(error):
+    """Timeouts and connection errors count against a host (probes never run under a caller's deadline)"""
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+def needs_network_probe(url, sniff_dimensions=False):
+    """Check whether probing url will hit the network (not a data URL, cached result or open circuit)"""
+    if url.lower().startswith('data:image/'):
+        return False
+    cache_key = canonical_url(url)
+    if PROBE_CACHE.has_fresh(cache_key, sniff_dimensions) or NEGATIVE_CACHE.has_fresh(cache_key):
+        return False
+    return not HOST_CIRCUITS.is_open(urlparse(url).netloc.lower())
+
+def get_image_info_detailed(url, session, sniff_dimensions=False, deadline=None):
+    """Get detailed image information similar to network_capture.py
+    
+    With sniff_dimensions, the first bytes of the image are read to add the real
+    format (sniffedType) and pixel width/height. The caller gets a failed result
+    once deadline runs out, while the probe itself keeps its adaptive timeouts.
+    """
     try:
         # Handle base64 data URLs
         if url.lower().startswith('data:image/'):
             mime_type, size_bytes, extension = get_base64_image_info(url)
             if mime_type:
-                return {
+                img_info = {
                     'url': url,
                     'name': f"base64_image_{extension}",
                     'size': format_file_size(size_bytes) if size_bytes > 0 else "(unknown)",
@@ -335,6 +1528,9 @@ def get_image_info_detailed(url, session):
                     'success': True,
                     'status': 200
                 }
+                if sniff_dimensions:
+                    img_info.update(sniff_data_url(url))
+                return img_info
             else:
                 return {
                     'url': url,
@@ -347,112 +1543,789 @@ def get_image_info_detailed(url, session):
                     'status': 'Invalid base64'
                 }
         
-        # For HTTP/HTTPS URLs, try HEAD first, then GET with range
+        # Concurrent probes of the same URL (e.g. from parallel extractions) share one
+        # lookup. It runs without any caller's deadline (adaptive timeouts still bound
+        # it), so a tight budget never cuts the probe short for the others; each
+        # caller stops waiting at its own deadline.
+        cache_key = canonical_url(url)
         try:
-            # Try HEAD request first
-            response = session.head(url, timeout=REQUEST_TIMEOUT, allow_redirects=True)
-            
-            # If HEAD fails, try GET with small range
-            if response.status_code >= 400:
-                response = session.get(url, timeout=REQUEST_TIMEOUT, 
-                                     headers={'Range': 'bytes=0-1023'}, 
-                                     allow_redirects=True)
-            
-            if response.status_code >= 400:
-                # Try one more time with regular GET but short timeout
-                try:
-                    response = session.get(url, timeout=5, allow_redirects=True, stream=True)
-                    # Read only first chunk to verify it's an image
-                    chunk = next(response.iter_content(1024), b'')
-                    response.close()
-                except:
-                    return create_failed_image_info(url, response.status_code)
-            
-            # Get content info from headers
-            content_type = response.headers.get('content-type', '').lower()
-            content_length = response.headers.get('content-length')
-            
-            # Verify it's an image by content-type or URL extension
-            is_image_mime = content_type.startswith('image/')
-            url_extension = get_extension_from_url(url)
-            
-            if not is_image_mime and url_extension == 'unknown':
-                return create_failed_image_info(url, 'Not an image')
-            
-            # If no MIME type but valid extension, construct MIME type
-            if not is_image_mime and url_extension != 'unknown':
-                content_type = f'image/{url_extension}'
-            
-            # Get file size
-            size_bytes = 0
-            if content_length:
-                try:
-                    size_bytes = int(content_length)
-                except ValueError:
-                    size_bytes = 0
-            
-            # Extract filename
-            filename = url.split('/')[-1].split('?')[0].split('#')[0]
-            if not filename or '.' not in filename:
-                extension = get_extension_from_mime_type(content_type)
-                if extension == 'unknown':
-                    extension = get_extension_from_url(url)
-                filename = f"image.{extension}" if extension != 'unknown' else 'image'
-            
-            # Get extension
-            extension = get_extension_from_mime_type(content_type)
-            if extension == 'unknown':
-                extension = get_extension_from_url(url)
-            
-            return {
-                'url': url,
-                'name': filename,
-                'size': format_file_size(size_bytes) if size_bytes > 0 else "(unknown)",
-                'size_bytes': size_bytes,
-                'type': extension,
-                'contentType': content_type,
-                'success': True,
-                'status': response.status_code
-            }
-            
-        except requests.exceptions.RequestException as e:
-            return create_failed_image_info(url, f'Request failed: {str(e)}')
+            img_info, shared = PROBE_FLIGHTS.do(
+                (cache_key, sniff_dimensions),
+                lambda: lookup_image_info(url, cache_key, session, sniff_dimensions),
+                deadline, detach=True)
+        except DeadlineExceeded:
+            return create_failed_image_info(url, 'Request failed: Deadline exceeded')
+        return dict(img_info, url=url) if shared else img_info
     
     except Exception as e:
         return create_failed_image_info(url, f'Error: {str(e)}')
 
-def create_failed_image_info(url, status):
-    """Create failed image info object"""
-    filename = url.split('/')[-1].split('?')[0][:50] if url else 'unknown'
-    return {
-        'url': url,
-        'name': filename,
-        'size': "(unknown)",
-        'size_bytes': 0,
-        'type': 'unknown',
-        'contentType': 'unknown',
-        'success': False,
-        'status': status
-    }
-
-def filter_same_domain_images(image_data, target_url):
-    """Filter images to only include those from the same domain - matches network_capture.py"""
-    filtered_images = []
-    removed_count = 0
-    removed_domains = set()
+def lookup_image_info(url, cache_key, session, sniff_dimensions=False):
+    """Answer a probe from the caches, or go to the network (circuit breaker and rate limit permitting)"""
+    # Serve from the probe cache, revalidating stale entries with a conditional request
+    entry = PROBE_CACHE.get(cache_key)
+    if entry is None and PERSISTENT_CACHE is not None:
+        entry = PERSISTENT_CACHE.get_probe(cache_key)
+        if entry is not None:
+            PROBE_CACHE.load(cache_key, entry)
+    if entry is not None and sniff_dimensions and 'sniffedType' not in entry['info']:
+        entry = None
+    if entry is not None and PROBE_CACHE.is_fresh(entry):
+        return dict(entry['info'], url=url)
     
-    for img in image_data:
-        if is_same_domain_url(img['url'], target_url):
-            filtered_images.append(img)
-        else:
-            removed_count += 1
-            try:
-                removed_domain = urlparse(img['url']).netloc.lower()
-                if removed_domain.startswith('www.'):
-                    removed_domain = removed_domain[4:]
-                removed_domains.add(removed_domain)
-            except:
-                pass
+    # URLs that just failed with 4xx/5xx are not probed again until the entry expires
+    negative_entry = NEGATIVE_CACHE.get(cache_key)
+    if negative_entry is not None and NEGATIVE_CACHE.is_fresh(negative_entry):
+        return dict(negative_entry['info'], url=url)
+    
+    # Fail fast while the host's circuit is open (a stale cache entry beats an error)
+    host = urlparse(url).netloc.lower()
+    if not HOST_CIRCUITS.allow(host):
+        if entry is not None:
+            return dict(entry['info'], url=url)
+        return create_failed_image_info(url, 'Host unavailable (circuit open)')
+    
+    # Stay polite: every probe that goes to the network waits for a per-host token
+    HOST_RATE_LIMITER.acquire(host)
+    
+    if entry is not None:
+        img_info = revalidate_image_info(url, cache_key, entry, session)
+        if img_info is not None and (not sniff_dimensions or 'sniffedType' in img_info):
+            HOST_CIRCUITS.record_success(host)
+            return img_info
+    
+    try:
+        img_info, response = None, None
+        if sniff_dimensions:
+            img_info, response = sniff_image_http(url, session)
+        if img_info is None:
+            img_info, response = probe_image_http(url, session)
+            if sniff_dimensions:
+                img_info.update({'sniffedType': None, 'width': None, 'height': None})
+    except requests.exceptions.RequestException as e:
+        if is_host_failure(e):
+            HOST_CIRCUITS.record_failure(host)
+        return create_failed_image_info(url, f'Request failed: {str(e)}')
+    
+    # Any HTTP answer, even an error status, means the host is reachable
+    HOST_CIRCUITS.record_success(host)
+    
+    if img_info['success']:
+        store_probe_result(cache_key, img_info, response.headers)
+    elif isinstance(img_info['status'], int) and img_info['status'] >= 400:
+        NEGATIVE_CACHE.put(cache_key, img_info)
+    
+    return img_info
+
+def probe_image_http(url, session):
+    """Probe an HTTP/HTTPS image with HEAD, then GET with range, then a streamed GET.
+    
+    Hosts remember the first method that worked, so later probes start there.
+    """
+    host = urlparse(url).netloc.lower()
+    learned_method = PROBE_STRATEGY.get(host)
+    start = PROBE_METHODS.index(learned_method) if learned_method else 0
+    if start:
+        PROBE_STRATEGY.record_saved(start)
+    
+    response = None
+    head_rejected = False
+    for method in PROBE_METHODS[start:]:
+        if method == 'head':
+            # Try HEAD request first
+            response = session.head(url, timeout=probe_timeout(url), allow_redirects=True)
+        elif method == 'range':
+            # If HEAD fails, try GET with small range. A 206 carries the full size in
+            # Content-Range; hosts that ignore Range are cut off after the first KB.
+            response = session.get(url, timeout=probe_timeout(url), 
+                                 headers={'Range': f'bytes=0-{PROBE_READ_BYTES - 1}'}, 
+                                 allow_redirects=True, stream=True)
+            data, complete = read_probe_body(response)
+        else:
+            # Try one more time with regular GET
+            try:
+                get_response = session.get(url, timeout=probe_timeout(url), allow_redirects=True, stream=True)
+                # Read only first chunk to verify it's an image
+                data, complete = read_probe_body(get_response)
+            except Exception:
+                if response is None:
+                    raise
+                return create_failed_image_info(url, response.status_code), response
+            response = get_response
+        
+        if response.status_code < 400:
+            # Only learn a fallback when the host refused HEAD itself, not when one URL is missing
+            if method == 'head' or start or head_rejected:
+                PROBE_STRATEGY.record(host, method)
+            break
+        
+        if method == 'head':
+            head_rejected = response.status_code in HEAD_REJECTED_STATUSES
+    
+    if response.status_code >= 400:
+        return create_failed_image_info(url, response.status_code), response
+    
+    # A body that ended inside the first read has a known size even without headers
+    size_bytes = None
+    if method != 'head' and response.status_code == 200 and complete:
+        size_bytes = len(data)
+    
+    return build_image_info_from_response(url, response, size_bytes), response
+
+def sniff_image_http(url, session):
+    """Probe an image with one ranged GET and sniff its format and dimensions.
+    
+    Reads until the dimensions are known or SNIFF_MAX_BYTES have been read.
+    Returns (None, response) when the host rejects the request.
+    """
+    response = session.get(url, timeout=probe_timeout(url),
+                           headers={'Range': f'bytes=0-{SNIFF_MAX_BYTES - 1}'},
+                           allow_redirects=True, stream=True)
+    if response.status_code >= 400:
+        response.close()
+        return None, response
+    
+    data = b''
+    complete = True
+    sniffed_type, width, height = None, None, None
+    try:
+        for chunk in response.iter_content(SNIFF_CHUNK_BYTES):
+            data += chunk
+            sniffed_type, width, height = sniff_image_header(data)
+            if width is not None or sniffed_type == 'unknown':
+                complete = False
+                break
+            if len(data) >= SNIFF_MAX_BYTES:
+                complete = False
+                break
+    finally:
+        response.close()
+    
+    # A body that ended inside the read window has a known size even without headers
+    size_bytes = len(data) if response.status_code == 200 and complete else None
+    img_info = build_image_info_from_response(url, response, size_bytes)
+    
+    # Magic bytes identify images served with a wrong or missing content-type
+    # (never an HTML page, whatever its body looks like)
+    served_html = 'text/html' in response.headers.get('content-type', '').lower()
+    if not img_info['success'] and sniffed_type not in (None, 'unknown') and not served_html:
+        img_info = build_image_info_from_response(url, response, size_bytes,
+                                                  content_type=SNIFFED_MIME_TYPES[sniffed_type])
+    
+    img_info.update({'sniffedType': sniffed_type or 'unknown', 'width': width, 'height': height})
+    return img_info, response
+
+def sniff_data_url(data_url):
+    """Sniff format and dimensions from the start of a data:image/ URL"""
+    header, payload = data_url.split(',', 1) if ',' in data_url else (data_url, '')
+    try:
+        if ';base64' in header.lower():
+            # Every 4 base64 characters decode to 3 bytes
+            clean_data = re.sub(r'\s+', '', payload)[:SNIFF_MAX_BYTES // 3 * 4]
+            data = base64.b64decode(clean_data + '=' * (-len(clean_data) % 4))
+        else:
+            data = unquote(payload[:SNIFF_MAX_BYTES]).encode('utf-8', 'replace')
+    except (ValueError, binascii.Error):
+        data = b''
+    
+    sniffed_type, width, height = sniff_image_header(data)
+    return {'sniffedType': sniffed_type or 'unknown', 'width': width, 'height': height}
+
+def sniff_image_header(data):
+    """Detect image format from magic bytes and parse width/height from its header.
+    
+    Returns (sniffed_type, width, height). sniffed_type is None while more data is
+    needed to decide, and width/height stay None until the header has been read.
+    """
+    if len(data) < 12:
+        return None, None, None
+    
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        if len(data) < 24:
+            return 'png', None, None
+        width, height = struct.unpack('>II', data[16:24])
+        return 'png', width, height
+    
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', data[6:10])
+        return 'gif', width, height
+    
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return ('webp',) + sniff_webp_dimensions(data)
+    
+    if data[:2] == b'\xff\xd8':
+        return ('jpg',) + sniff_jpeg_dimensions(data)
+    
+    if data[4:8] == b'ftyp':
+        brands = data[8:12] + data[16:min(len(data), 8 + struct.unpack('>I', data[:4])[0])]
+        sniffed_type = 'avif' if b'avif' in brands or b'avis' in brands else 'heic'
+        return (sniffed_type,) + sniff_isobmff_dimensions(data)
+    
+    if data[:2] == b'BM' and len(data) >= 26:
+        width, height = struct.unpack('<ii', data[18:26])
+        return 'bmp', width, abs(height)
+    
+    if data[:4] == b'\x00\x00\x01\x00':
+        # ICO directory entry: 0 means 256 pixels
+        return 'ico', data[6] or 256, data[7] or 256
+    
+    text_start = data.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if text_start.startswith(b'<'):
+        return sniff_svg_dimensions(data)
+    
+    return 'unknown', None, None
+
+def sniff_webp_dimensions(data):
+    """Parse width/height from a WebP VP8, VP8L or VP8X chunk"""
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30:
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L' and len(data) >= 25:
+        b0, b1, b2, b3 = data[21:25]
+        width = (b0 | ((b1 & 0x3f) << 8)) + 1
+        height = ((b1 >> 6) | (b2 << 2) | ((b3 & 0x0f) << 10)) + 1
+        return width, height
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None, None
+
+def sniff_jpeg_dimensions(data):
+    """Walk JPEG segments up to the first SOF marker and read its dimensions"""
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            # Markers without a length field
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(data):
+                break
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        segment_length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        i += 2 + segment_length
+    return None, None
+
+def sniff_isobmff_dimensions(data):
+    """Read width/height from the 'ispe' property box of an AVIF/HEIF image"""
+    index = data.find(b'ispe')
+    if index < 0 or index + 16 > len(data):
+        return None, None
+    width, height = struct.unpack('>II', data[index + 8:index + 16])
+    return width, height
+
+def sniff_svg_dimensions(data):
+    """Read width/height (or the viewBox size) from the root <svg> tag.
+    
+    Only documents whose root element is <svg> count, with nothing but an XML
+    prolog, comments or an SVG doctype before it (an HTML page with an inline
+    icon is not an SVG image).
+    """
+    text = data.decode('utf-8', 'replace').lstrip('\ufeff')
+    position = 0
+    while True:
+        match = SVG_PROLOG_PATTERN.match(text, position)
+        if match is None:
+            break
+        position = match.end()
+    rest = text[position:].lstrip()
+    
+    if not (rest.startswith('<svg') and rest[4:5] in (' ', '\t', '\r', '\n', '>', '/')):
+        # A prolog item or the root tag may still be cut off at the end of the data
+        incomplete = (not rest or '<svg'.startswith(rest) or
+                      (rest.startswith('<?') and '?>' not in rest) or
+                      (rest.startswith('<!--') and '-->' not in rest) or
+                      (rest.startswith('<!') and '>' not in rest))
+        if incomplete and len(data) < SNIFF_MAX_BYTES:
+            return None, None, None
+        return 'unknown', None, None
+    tag_start = len(text) - len(rest)
+    
+    tag_end = text.find('>', tag_start)
+    if tag_end < 0:
+        return 'svg', None, None
+    tag = text[tag_start:tag_end]
+    
+    attrs = dict((name.lower(), value) for name, value in SVG_ATTR_PATTERN.findall(tag))
+    width = parse_svg_length(attrs.get('width'))
+    height = parse_svg_length(attrs.get('height'))
+    if (width is None or height is None) and attrs.get('viewbox'):
+        parts = re.split(r'[\s,]+', attrs['viewbox'].strip())
+        if len(parts) == 4:
+            try:
+                width = width if width is not None else int(round(float(parts[2])))
+                height = height if height is not None else int(round(float(parts[3])))
+            except ValueError:
+                pass
+    if width is None or height is None:
+        # Relative or missing size: the SVG has no intrinsic dimensions
+        return 'svg', None, None
+    return 'svg', width, height
+
+def parse_svg_length(value):
+    """Convert an SVG width/height attribute to pixels (None for relative units)"""
+    if not value:
+        return None
+    match = re.match(r'\s*([0-9.]+)\s*(px)?\s*$', value)
+    if not match:
+        return None
+    try:
+        return int(round(float(match.group(1))))
+    except ValueError:
+        return None
+
+def read_probe_body(response, limit=PROBE_READ_BYTES):
+    """Read at most limit bytes of a streamed response, then close it.
+    
+    Returns (data, complete) where complete means the whole body was read.
+    """
+    data = b''
+    try:
+        for chunk in response.iter_content(limit):
+            data += chunk
+            if len(data) > limit:
+                return data[:limit], False
+        return data, True
+    finally:
+        response.close()
+
+def parse_content_range_total(content_range):
+    """Parse the complete length from a Content-Range header like 'bytes 0-1023/48213'"""
+    if not content_range:
+        return None
+    match = CONTENT_RANGE_PATTERN.match(content_range.strip())
+    if not match:
+        return None
+    return int(match.group(1))
+
+def get_response_size(response):
+    """Get the full object size from a probe response's headers (0 if unknown)"""
+    if response.status_code == 206:
+        # Content-Length of a partial response is the slice, the total is in Content-Range
+        total = parse_content_range_total(response.headers.get('content-range'))
+        return total or 0
+    
+    content_length = response.headers.get('content-length')
+    if content_length:
+        try:
+            return int(content_length)
+        except ValueError:
+            return 0
+    return 0
+
+def build_image_info_from_response(url, response, size_bytes=None, content_type=None):
+    """Build the image info object from the headers of a probe response"""
+    # Get content info from headers
+    if content_type is None:
+        content_type = response.headers.get('content-type', '').lower()
+    
+    # Verify it's an image by content-type or URL extension
+    is_image_mime = content_type.startswith('image/')
+    url_extension = get_extension_from_url(url)
+    
+    if not is_image_mime and url_extension == 'unknown':
+        return create_failed_image_info(url, 'Not an image')
+    
+    # If no MIME type but valid extension, construct MIME type
+    if not is_image_mime and url_extension != 'unknown':
+        content_type = f'image/{url_extension}'
+    
+    # Get file size
+    if size_bytes is None:
+        size_bytes = get_response_size(response)
+    
+    # Extract filename
+    filename = url.split('/')[-1].split('?')[0].split('#')[0]
+    if not filename or '.' not in filename:
+        extension = get_extension_from_mime_type(content_type)
+        if extension == 'unknown':
+            extension = get_extension_from_url(url)
+        filename = f"image.{extension}" if extension != 'unknown' else 'image'
+    
+    # Get extension
+    extension = get_extension_from_mime_type(content_type)
+    if extension == 'unknown':
+        extension = get_extension_from_url(url)
+    
+    return {
+        'url': url,
+        'name': filename,
+        'size': format_file_size(size_bytes) if size_bytes > 0 else "(unknown)",
+        'size_bytes': size_bytes,
+        'type': extension,
+        'contentType': content_type,
+        'success': True,
+        'status': response.status_code
+    }
+
+def revalidate_image_info(url, cache_key, entry, session):
+    """Revalidate a stale cached probe with If-None-Match / If-Modified-Since.
+    
+    Returns None when the entry cannot be revalidated and a full probe is needed.
+    """
+    headers = {}
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['lastModified']:
+        headers['If-Modified-Since'] = entry['lastModified']
+    if not headers:
+        return None
+    
+    # Hosts known to reject HEAD are revalidated with a one-byte conditional GET
+    use_head = PROBE_STRATEGY.get(urlparse(url).netloc.lower()) in (None, 'head')
+    try:
+        if use_head:
+            response = session.head(url, timeout=probe_timeout(url), headers=headers, allow_redirects=True)
+        else:
+            headers['Range'] = 'bytes=0-0'
+            response = session.get(url, timeout=probe_timeout(url), headers=headers,
+                                   allow_redirects=True, stream=True)
+            response.close()
+    except requests.exceptions.RequestException:
+        return None
+    
+    if response.status_code == 304:
+        refresh_probe_result(cache_key)
+        return dict(entry['info'], url=url)
+    
+    if response.status_code >= 400:
+        return None
+    
+    img_info = build_image_info_from_response(url, response)
+    if img_info['success']:
+        store_probe_result(cache_key, img_info, response.headers)
+    return img_info
+
+def create_failed_image_info(url, status):
+    """Create failed image info object"""
+    filename = url.split('/')[-1].split('?')[0][:50] if url else 'unknown'
+    return {
+        'url': url,
+        'name': filename,
+        'size': "(unknown)",
+        'size_bytes': 0,
+        'type': 'unknown',
+        'contentType': 'unknown',
+        'success': False,
+        'status': status
+    }
+
+class ImageProbePool:
+    """Bounded thread pool for image probes with a per-host concurrency limit.
+    
+    URLs can be submitted at any time (e.g. while the page is still downloading);
+    iter_finished yields (index, img_info) in completion order.
+    """
+    
+    def __init__(self, session, max_workers=None, max_per_host=None, sniff_dimensions=False, deadline=None):
+        # Callers may lower the limits but never raise them above the configured ones
+        self.max_workers = int_option(max_workers, PROBE_MAX_WORKERS, PROBE_MAX_WORKERS)
+        self.max_per_host = int_option(max_per_host, PROBE_MAX_PER_HOST, PROBE_MAX_PER_HOST)
+        self.session = session
+        self.sniff_dimensions = sniff_dimensions
+        self.deadline = deadline
+        self.timed_out = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._finished = queue.Queue()
+        self._submitted = 0
+        self._reported = 0
+        
+        # One semaphore per host so a single origin never sees more than max_per_host probes
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+    
+    def get_host_slot(self, img_url):
+        host = urlparse(img_url).netloc.lower()
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+    
+    def probe(self, index, img_url):
+        print(f"Processing image {index+1}: {img_url[:60]}...")
+        if not needs_network_probe(img_url, self.sniff_dimensions):
+            return get_image_info_detailed(img_url, self.session, self.sniff_dimensions, self.deadline)
+        
+        with self.get_host_slot(img_url):
+            return get_image_info_detailed(img_url, self.session, self.sniff_dimensions, self.deadline)
+    
+    @property
+    def submitted(self):
+        return self._submitted
+    
+    @property
+    def pending(self):
+        """Probes submitted but not yet reported"""
+        return self._submitted - self._reported
+    
+    def submit(self, img_url, result=None):
+        """Queue a probe and return its index; a known result is reported without probing"""
+        index = self._submitted
+        self._submitted += 1
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            self._finished.put((index, future))
+            return index
+        future = self._executor.submit(self.probe, index, img_url)
+        future.add_done_callback(lambda future, index=index: self._finished.put((index, future)))
+        return index
+    
+    def iter_finished(self, wait=True):
+        """Yield (index, img_info) for finished probes; without wait, only those already done.
+        
+        Waiting stops when the deadline runs out, leaving the rest pending.
+        """
+        while self._reported < self._submitted:
+            timeout = self.deadline.remaining() if wait and self.deadline else None
+            try:
+                index, future = self._finished.get(block=wait, timeout=timeout)
+            except queue.Empty:
+                if wait:
+                    self.timed_out = True
+                return
+            self._reported += 1
+            yield index, future.result()
+    
+    def shutdown(self):
+        # Stop queued probes if the consumer goes away (e.g. a streaming client disconnects)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class FairProbeScheduler:
+    """Probe threads shared by many extractions, serving hosts in turn.
+    
+    Probes are queued per host and workers take the next host round-robin, so a
+    site with thousands of images cannot starve the others, and no host ever has
+    more than max_per_host probes running. Each extraction talks to the scheduler
+    through its own ScheduledProbePool.
+    """
+    
+    def __init__(self, session, max_workers=None, max_per_host=None):
+        self.max_workers = int_option(max_workers, BATCH_MAX_WORKERS, BATCH_MAX_WORKERS)
+        self.max_per_host = int_option(max_per_host, PROBE_MAX_PER_HOST, PROBE_MAX_PER_HOST)
+        self.session = session
+        self._queues = OrderedDict()  # host -> deque of (pool, index, img_url)
+        self._running = Counter()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self.work, name=f'fair-probe-{i}', daemon=True)
+                         for i in range(self.max_workers)]
+        for worker in self._workers:
+            worker.start()
+    
+    def enqueue(self, pool, index, img_url):
+        host = urlparse(img_url).netloc.lower()
+        with self._cond:
+            self._queues.setdefault(host, deque()).append((pool, index, img_url))
+            self._cond.notify()
+    
+    def next_probe(self):
+        """Take the next probe of the first host with a free slot (caller holds the lock)"""
+        for host, probes in self._queues.items():
+            if self._running[host] >= self.max_per_host:
+                continue
+            probe = probes.popleft()
+            if probes:
+                # Rotate the host to the back so the others go first next time
+                self._queues.move_to_end(host)
+            else:
+                del self._queues[host]
+            self._running[host] += 1
+            return host, probe
+        return None
+    
+    def work(self):
+        while True:
+            with self._cond:
+                picked = None
+                while not self._closed:
+                    picked = self.next_probe()
+                    if picked is not None:
+                        break
+                    self._cond.wait()
+                if picked is None:
+                    return
+            
+            host, (pool, index, img_url) = picked
+            try:
+                pool.run(index, img_url)
+            finally:
+                with self._cond:
+                    self._running[host] -= 1
+                    if not self._running[host]:
+                        del self._running[host]
+                    # A freed host slot may unblock a waiting worker
+                    self._cond.notify()
+    
+    def cancel(self, pool):
+        """Drop the queued probes of one pool, returning them as (pool, index, img_url)"""
+        dropped = []
+        with self._cond:
+            for host in list(self._queues):
+                probes = deque()
+                for probe in self._queues[host]:
+                    (dropped if probe[0] is pool else probes).append(probe)
+                if probes:
+                    self._queues[host] = probes
+                else:
+                    del self._queues[host]
+        return dropped
+    
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._queues.clear()
+            self._cond.notify_all()
+
+class ScheduledProbePool(ImageProbePool):
+    """ImageProbePool interface for one extraction whose probes run on a FairProbeScheduler"""
+    
+    def __init__(self, scheduler, sniff_dimensions=False, deadline=None):
+        self.session = scheduler.session
+        self.sniff_dimensions = sniff_dimensions
+        self.deadline = deadline
+        self.timed_out = False
+        self._scheduler = scheduler
+        self._finished = queue.Queue()
+        self._submitted = 0
+        self._reported = 0
+    
+    def submit(self, img_url, result=None):
+        if result is not None:
+            return super().submit(img_url, result)
+        index = self._submitted
+        self._submitted += 1
+        self._scheduler.enqueue(self, index, img_url)
+        return index
+    
+    def run(self, index, img_url):
+        """Called on a scheduler thread (host limits are enforced by the scheduler)"""
+        print(f"Processing image {index+1}: {img_url[:60]}...")
+        future = Future()
+        try:
+            future.set_result(get_image_info_detailed(img_url, self.session, self.sniff_dimensions, self.deadline))
+        except Exception as e:
+            future.set_exception(e)
+        self._finished.put((index, future))
+    
+    def shutdown(self):
+        self._scheduler.cancel(self)
+
+class CrawlImageRegistry:
+    """Image URLs probed during one crawl, so pages sharing an image wait for one probe.
+    
+    URLs are matched by canonical_url, and each page gets the result under its own spelling.
+    """
+    
+    def __init__(self):
+        self._results = {}
+        self._waiting = {}  # canonical URL -> [(pool, index, img_url)] while its probe runs
+        self._lock = threading.Lock()
+        self.duplicates = 0
+    
+    def claim(self, img_url, pool, index):
+        """Return True if the caller has to probe img_url; otherwise the result is reported to pool"""
+        key = canonical_url(img_url)
+        with self._lock:
+            if key in self._waiting:
+                self._waiting[key].append((pool, index, img_url))
+                self.duplicates += 1
+                return False
+            if key not in self._results:
+                self._waiting[key] = [(pool, index, img_url)]
+                return True
+            self.duplicates += 1
+            img_info = self._results[key]
+        pool.report(index, dict(img_info, url=img_url) if img_info['url'] != img_url else img_info)
+        return False
+    
+    def complete(self, img_url, img_info):
+        """Record a finished probe, returning the (pool, index, img_url) entries waiting for it"""
+        key = canonical_url(img_url)
+        with self._lock:
+            self._results[key] = img_info
+            return self._waiting.pop(key, [])
+    
+    def release(self, img_url, pool):
+        """Give up pool's claim on a probe it will not run.
+        
+        Returns the (pool, index, img_url) entry of the next waiting page, which
+        becomes the prober, or None when no other page is waiting.
+        """
+        key = canonical_url(img_url)
+        with self._lock:
+            waiting = [entry for entry in self._waiting.pop(key, []) if entry[0] is not pool]
+            if not waiting:
+                return None
+            self._waiting[key] = waiting
+            return waiting[0]
+
+class CrawlProbePool(ScheduledProbePool):
+    """ScheduledProbePool for one page of a crawl; images seen on other pages are not probed again"""
+    
+    def __init__(self, scheduler, registry, sniff_dimensions=False, deadline=None):
+        super().__init__(scheduler, sniff_dimensions, deadline)
+        self._registry = registry
+    
+    def submit(self, img_url, result=None):
+        if result is not None:
+            return super().submit(img_url, result)
+        index = self._submitted
+        self._submitted += 1
+        if self._registry.claim(img_url, self, index):
+            self._scheduler.enqueue(self, index, img_url)
+        return index
+    
+    def run(self, index, img_url):
+        print(f"Processing image {index+1}: {img_url[:60]}...")
+        try:
+            img_info = get_image_info_detailed(img_url, self.session, self.sniff_dimensions, self.deadline)
+        except Exception as e:
+            img_info = create_failed_image_info(img_url, f'Error: {str(e)}')
+        for pool, waiting_index, waiting_url in self._registry.complete(img_url, img_info):
+            pool.report(waiting_index, dict(img_info, url=waiting_url) if waiting_url != img_url else img_info)
+    
+    def report(self, index, img_info):
+        future = Future()
+        future.set_result(img_info)
+        self._finished.put((index, future))
+    
+    def shutdown(self):
+        # Pages waiting on probes this page dropped take them over, so they never hang
+        for _, _, img_url in self._scheduler.cancel(self):
+            owner = self._registry.release(img_url, self)
+            if owner is not None:
+                self._scheduler.enqueue(*owner)
+
+def filter_same_domain_images(image_data, target_url):
+    """Filter images to only include those from the same domain - matches network_capture.py"""
+    filtered_images = []
+    removed_count = 0
+    removed_domains = set()
+    
+    for img in image_data:
+        if is_same_domain_url(img['url'], target_url):
+            filtered_images.append(img)
+        else:
+            removed_count += 1
+            try:
+                removed_domain = urlparse(img['url']).netloc.lower()
+                if removed_domain.startswith('www.'):
+                    removed_domain = removed_domain[4:]
+                removed_domains.add(removed_domain)
+            except:
+                pass
     
     if removed_count > 0:
         print(f"✓ Filtered out {removed_count} external domain images:")
@@ -461,55 +2334,212 @@ def filter_same_domain_images(image_data, target_url):
     
     return filtered_images
 
-def extract_images_from_website(url, options=None):
-    """Extract images from a website with comprehensive analysis"""
+def iter_extraction_events(url, options=None, previous=None, pool=None, collect_links=False):
+    """Extract images from a website, yielding events as each stage produces results.
+    
+    Yields a 'page' event with the page status and validators, 'discovered' events
+    with newly found same-domain image URLs, an 'image' event per finished probe,
+    and a final 'stats' event whose urlVariants map each probed URL to the other
+    spellings of it that shared the probe (see canonical_url). In pipelined mode the page is parsed while it
+    downloads and each image is probed as soon as it is seen.
+    
+    previous is an earlier scan of the site (see record_scan): the page is fetched
+    conditionally against it and its still-fresh image results are reused.
+    A pool (e.g. a ScheduledProbePool of a batch) replaces the extraction's own
+    probe pool, and its deadline replaces the deadline_ms option. With
+    collect_links a 'links' event lists the page's <a> links; the page is then
+    always fetched in full and non-HTML bodies are skipped.
+    """
     if options is None:
         options = {}
     
     print(f"Extracting images from: {url}")
     
     session = get_session()
+    if pool is None:
+        pool = ImageProbePool(
+            session,
+            max_workers=options.get('maxWorkers'),
+            max_per_host=options.get('maxPerHost'),
+            sniff_dimensions=bool(options.get('sniffDimensions')),
+            deadline=Deadline.from_options(options),
+        )
+    deadline = pool.deadline or Deadline()
+    url_variants = {}  # canonical URL -> every spelling found, the probed one first
+    reusable = get_reusable_results(previous, pool.sniff_dimensions)
+    
+    def dispatch(img_urls):
+        """Queue probes for new same-domain URLs, returning the ones queued"""
+        queued = []
+        for img_url in img_urls:
+            key = canonical_url(img_url)
+            variants = url_variants.get(key)
+            if variants is not None:
+                if img_url not in variants:
+                    variants.append(img_url)
+                continue
+            url_variants[key] = [img_url]
+            # Filter same-domain images first (like network_capture.py)
+            if is_same_domain_url(img_url, url):
+                pool.submit(img_url, reusable.get(img_url))
+                queued.append(img_url)
+        return queued
     
     try:
-        # Get the main page
+        image_data = []
+        
+        # Get the main page, conditionally when its image URLs are known from the
+        # previous scan or cached on disk
         print("Loading page and capturing network requests...")
-        response = session.get(url, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
+        page_key = canonical_url(url)
+        page_entry = previous
+        if page_entry is None and PERSISTENT_CACHE is not None and not collect_links:
+            page_entry = PERSISTENT_CACHE.get_page(page_key)
+        headers = {}
+        if page_entry is not None:
+            if page_entry['etag']:
+                headers['If-None-Match'] = page_entry['etag']
+            if page_entry['lastModified']:
+                headers['If-Modified-Since'] = page_entry['lastModified']
+        response = session.get(url, timeout=budget_timeout(REQUEST_TIMEOUT, deadline), headers=headers, stream=True)
+        
+        pipeline = options.get('pipeline', PIPELINE_EXTRACTION)
+        max_page_bytes = int_option(options.get('maxPageBytes'), MAX_FILE_SIZE, MAX_FILE_SIZE)
+        page = PageReader(response, max_page_bytes)
+        not_modified = bool(headers) and response.status_code == 304
+        yield {
+            'event': 'page',
+            'status': response.status_code,
+            'notModified': not_modified,
+            'etag': response.headers.get('etag') or (page_entry['etag'] if not_modified else None),
+            'lastModified': response.headers.get('last-modified') or (page_entry['lastModified'] if not_modified else None),
+        }
+        
+        if not_modified:
+            response.close()
+            print("Page not modified, reusing cached image URLs")
+            if page_entry is not previous:
+                PERSISTENT_CACHE.refresh_page(page_key)
+            image_urls, stylesheet_urls = list(page_entry['imageUrls']), list(page_entry['stylesheetUrls'])
+            page_variants = {}
+        else:
+            response.raise_for_status()
+            
+            # Stream the page into the parser with a hard byte cap, so memory stays flat
+            # however large the page is. In pipelined mode probes are dispatched as
+            # soon as the parser finds each image.
+            parser = ImageHTMLParser(url)
+            found = []
+            parser.on_image_url = found.append
+            parsed = False
+            
+            # A crawl can follow links to non-HTML resources (feeds, downloads)
+            content_type = response.headers.get('content-type', '').lower()
+            skip_body = collect_links and content_type and 'html' not in content_type
+            if skip_body:
+                response.close()
+                print(f"Skipping non-HTML page ({content_type})")
+            
+            print("Analyzing HTML content for images...")
+            try:
+                for text in (() if skip_body else page):
+                    parser.feed(text)
+                    if deadline.expired():
+                        print("Deadline reached while loading the page")
+                        break
+                    if not pipeline:
+                        continue
+                    queued = dispatch(found)
+                    del found[:]
+                    if queued:
+                        yield {'event': 'discovered', 'imageUrls': queued, 'found': len(url_variants)}
+                    for index, img_info in pool.iter_finished(wait=False):
+                        image_data.append(img_info)
+                        yield {'event': 'image', 'index': index, 'imageData': img_info}
+                else:
+                    parsed = True
+                parser.close()
+            except requests.exceptions.RequestException:
+                raise
+            except Exception as e:
+                parsed = False
+                print(f"Error parsing HTML: {str(e)}")
+            
+            if page.truncated:
+                print(f"Page exceeded {max_page_bytes} bytes, results are partial")
+            
+            image_urls, stylesheet_urls = found, list(parser.stylesheet_urls)
+            page_variants = parser.url_variants
+            
+            # Only complete parses of pages with validators are worth keeping
+            validated = response.headers.get('etag') or response.headers.get('last-modified')
+            if PERSISTENT_CACHE is not None and parsed and not page.truncated and validated:
+                PERSISTENT_CACHE.put_page(page_key, parser.image_urls, stylesheet_urls, response.headers)
+            
+            if collect_links:
+                yield {'event': 'links', 'urls': list(parser.link_urls)}
         
-        # Extract images from HTML
-        print("Analyzing HTML content for images...")
-        image_urls = extract_images_from_html(response.text, url)
+        # The page's own images are probed while the stylesheets load
+        queued = dispatch(image_urls)
         
-        # Remove duplicates
-        unique_urls = list(set(image_urls))
+        # Spellings the parser already folded together
+        for key, variants in page_variants.items():
+            merged = url_variants.get(key)
+            if merged is not None:
+                merged.extend(variant for variant in variants if variant not in merged)
         
-        print(f"Found {len(unique_urls)} unique image URLs")
+        if queued:
+            yield {'event': 'discovered', 'imageUrls': queued, 'found': len(url_variants)}
         
-        # Filter same-domain images first (like network_capture.py)
-        same_domain_urls = [img_url for img_url in unique_urls if is_same_domain_url(img_url, url)]
+        # Background images from linked stylesheets (and their @imports), as a second batch
+        if stylesheet_urls and options.get('includeStylesheets', FETCH_STYLESHEETS):
+            print(f"Fetching {len(stylesheet_urls)} linked stylesheets...")
+            stylesheet_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stylesheets')
+            stylesheets = stylesheet_executor.submit(fetch_stylesheet_images, stylesheet_urls, session, deadline=deadline)
+            stylesheet_executor.shutdown(wait=False)
+            # Report page image results as they finish until the stylesheets are in
+            while True:
+                for index, img_info in pool.iter_finished(wait=False):
+                    image_data.append(img_info)
+                    yield {'event': 'image', 'index': index, 'imageData': img_info}
+                if wait([stylesheets], timeout=STYLESHEET_POLL_INTERVAL).done:
+                    break
+            queued = dispatch(sorted(stylesheets.result()))
+            if queued:
+                yield {'event': 'discovered', 'imageUrls': queued, 'found': len(url_variants)}
         
-        print(f"After domain filtering: {len(same_domain_urls)} same-domain images")
+        print(f"Found {len(url_variants)} unique image URLs")
+        print(f"After domain filtering: {pool.submitted} same-domain images")
         
         # Get detailed info for each image
         print("Getting detailed image information...")
-        image_data = []
-        for i, img_url in enumerate(same_domain_urls):
-            print(f"Processing image {i+1}/{len(same_domain_urls)}: {img_url[:60]}...")
-            img_info = get_image_info_detailed(img_url, session)
+        for index, img_info in pool.iter_finished():
             image_data.append(img_info)
-            
-            # Small delay to avoid overwhelming the server
-            time.sleep(0.1)
+            yield {'event': 'image', 'index': index, 'imageData': img_info}
         
-        # Filter out failed requests (like network_capture.py only shows successful ones)
-        valid_images = [img for img in image_data if img['success']]
+        timed_out = pool.timed_out or deadline.expired()
+        if pool.timed_out:
+            # Cancel probes that have not started; their results are left out
+            pool.shutdown()
+            print(f"Deadline reached: {pool.pending} probes still pending")
         
-        # Sort by size (largest first) like network_capture.py
-        image_data.sort(key=lambda x: x['size_bytes'], reverse=True)
+        stats = build_extraction_stats(image_data)
+        stats['pageBytes'] = page.bytes_read
+        stats['pageTruncated'] = page.truncated
+        stats['timedOut'] = timed_out
+        stats['pendingCount'] = pool.pending
+        stats['partial'] = page.truncated or timed_out
+        stats['pageNotModified'] = not_modified
+        stats['reused'] = len([variants for variants in url_variants.values() if variants[0] in reusable])
         
-        print(f"Final result: {len(valid_images)} valid images")
+        # Other spellings of each probed same-domain URL, which shared its probe
+        duplicates = {variants[0]: variants[1:] for variants in url_variants.values()
+                      if len(variants) > 1 and is_same_domain_url(variants[0], url)}
+        stats['duplicateProbesAvoided'] = sum(len(variants) for variants in duplicates.values())
         
-        return image_data, same_domain_urls
+        print(f"Final result: {stats['valid']} valid images")
+        
+        yield {'event': 'stats', 'stats': stats, 'urlVariants': duplicates}
         
     except requests.exceptions.RequestException as e:
         print(f"Error fetching website: {str(e)}")
@@ -517,6 +2547,858 @@ def extract_images_from_website(url, options=None):
     except Exception as e:
         print(f"Error extracting images: {str(e)}")
         raise Exception(f"Failed to extract images: {str(e)}")
+    finally:
+        pool.shutdown()
+
+def iter_response_chunks(response, chunk_size=PAGE_CHUNK_BYTES):
+    """Yield body chunks as soon as they arrive instead of waiting for chunk_size bytes"""
+    raw = response.raw
+    if not hasattr(raw, 'read1'):
+        # urllib3 < 2 has no read1
+        yield from response.iter_content(chunk_size)
+        return
+    
+    try:
+        while True:
+            chunk = raw.read1(chunk_size, decode_content=True)
+            if not chunk:
+                break
+            yield chunk
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+
+class PageReader:
+    """Iterate over the decoded text of a streamed page, stopping at max_bytes.
+    
+    After iteration, bytes_read is the number of body bytes consumed and
+    truncated tells whether the cap cut the page short.
+    """
+    
+    def __init__(self, response, max_bytes=MAX_FILE_SIZE, chunk_size=PAGE_CHUNK_BYTES):
+        self.response = response
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.truncated = False
+    
+    def __iter__(self):
+        try:
+            decoder = codecs.getincrementaldecoder(self.response.encoding or 'utf-8')(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        
+        try:
+            for chunk in iter_response_chunks(self.response, self.chunk_size):
+                remaining = self.max_bytes - self.bytes_read
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+                    self.truncated = True
+                self.bytes_read += len(chunk)
+                
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+                if self.truncated:
+                    break
+            
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield text
+        finally:
+            self.response.close()
+
+def extract_images_from_website(url, options=None):
+    """Extract images from a website with comprehensive analysis"""
+    result = collect_extraction(url, options)
+    return result['imageData'], result['imageUrls']
+
+def collect_extraction(url, options=None, pool=None, collect_links=False):
+    """Run an extraction to completion, returning imageUrls, imageData (largest first) and stats.
+    
+    With the incremental option the site's previous scan is reused (conditional page
+    fetch, fresh probe results kept) and a 'changes' block lists added, removed and
+    changed images. With collect_links the page's links are returned as 'links'.
+    """
+    if options is None:
+        options = {}
+    incremental = bool(options.get('incremental'))
+    scan_key = canonical_url(url)
+    previous = SCAN_HISTORY.get(scan_key) if incremental else None
+    
+    same_domain_urls = []
+    image_data = []
+    stats = None
+    url_variants = {}
+    page = None
+    links = []
+    for event in iter_extraction_events(url, options, previous, pool, collect_links):
+        if event['event'] == 'page':
+            page = event
+        elif event['event'] == 'links':
+            links = event['urls']
+        elif event['event'] == 'discovered':
+            same_domain_urls.extend(event['imageUrls'])
+            image_data.extend([None] * len(event['imageUrls']))
+        elif event['event'] == 'image':
+            image_data[event['index']] = event['imageData']
+        elif event['event'] == 'stats':
+            stats = event['stats']
+            url_variants = event['urlVariants']
+    
+    # Probes still pending when the deadline ran out have no result
+    image_data = [img for img in image_data if img is not None]
+    
+    # Sort by size (largest first) like network_capture.py
+    image_data.sort(key=lambda x: x['size_bytes'], reverse=True)
+    
+    result = {'imageUrls': same_domain_urls, 'imageData': image_data, 'stats': stats, 'urlVariants': url_variants}
+    if collect_links:
+        result['links'] = links
+    if incremental:
+        result['changes'] = record_scan(scan_key, previous, page, same_domain_urls, image_data, stats)
+    return result
+
+def get_reusable_results(previous, sniff_dimensions=False):
+    """Map image URL -> result from a previous scan that is still fresh enough to skip probing"""
+    if not previous:
+        return {}
+    now = time.time()
+    reusable = {}
+    for img_url, image in previous['images'].items():
+        info = image['info']
+        if not info.get('success') or now - image['checkedAt'] >= PROBE_CACHE_TTL:
+            continue
+        if sniff_dimensions and 'sniffedType' not in info:
+            continue
+        reusable[img_url] = info
+    return reusable
+
+def record_scan(scan_key, previous, page, image_urls, image_data, stats):
+    """Store this scan for the next incremental run and return its diff against previous.
+    
+    Page validators are only kept for complete scans, so a partial one is never
+    mistaken for the full page on a 304.
+    """
+    now = time.time()
+    previous_images = previous['images'] if previous else {}
+    
+    images = {}
+    changed = []
+    for img_info in image_data:
+        img_url = img_info['url']
+        old = previous_images.get(img_url)
+        if old is not None and old['info'] is img_info:
+            # Reused without probing, so it keeps its original check time
+            images[img_url] = old
+            continue
+        images[img_url] = {'info': img_info, 'checkedAt': now}
+        if old is not None and image_changed(old['info'], img_info):
+            changed.append(img_url)
+    
+    # Probes cut off by the deadline keep their previous result
+    for img_url in image_urls:
+        if img_url not in images and img_url in previous_images:
+            images[img_url] = previous_images[img_url]
+    
+    complete = page is not None and not stats['partial']
+    SCAN_HISTORY.put(scan_key, {
+        'imageUrls': list(image_urls),
+        'stylesheetUrls': [],  # stylesheet images are already part of imageUrls
+        'images': images,
+        'etag': page['etag'] if complete else None,
+        'lastModified': page['lastModified'] if complete else None,
+        'storedAt': now,
+    })
+    
+    current = set(image_urls)
+    added = [img_url for img_url in image_urls if img_url not in previous_images]
+    removed = [img_url for img_url in (previous['imageUrls'] if previous else []) if img_url not in current]
+    return {
+        'previousScan': datetime.fromtimestamp(previous['storedAt']).isoformat() if previous else None,
+        'pageNotModified': stats['pageNotModified'],
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'unchanged': len(current) - len(added) - len(changed),
+        'reused': stats['reused'],
+    }
+
+def image_changed(old_info, new_info):
+    """Compare the fields of two probe results that matter to a rescan"""
+    fields = ('success', 'size_bytes', 'contentType', 'width', 'height')
+    return any(old_info.get(field) != new_info.get(field) for field in fields)
+
+def collect_extraction_shared(url, options=None):
+    """collect_extraction, joining an identical extraction (same normalized URL and options) already running"""
+    key = (canonical_url(url), json.dumps(options or {}, sort_keys=True, default=str))
+    result, shared = EXTRACTION_FLIGHTS.do(key, lambda: collect_extraction(url, options))
+    if shared:
+        print(f"Joined running extraction of {url}")
+    return result
+
+def collect_crawl(start_url, options=None):
+    """Crawl same-domain pages from start_url and extract the images of each.
+    
+    Links are followed breadth-first up to maxDepth hops and maxPages pages (never
+    above CRAWL_MAX_DEPTH / CRAWL_MAX_PAGES), CRAWL_MAX_CONCURRENT_PAGES pages are
+    fetched at a time, and each image URL is probed once however many pages use it.
+    Returns per-page results with their image weight, the site's unique imageUrls
+    and imageData (largest first) and combined stats.
+    """
+    if options is None:
+        options = {}
+    
+    started = time.monotonic()
+    max_pages = int_option(options.get('maxPages'), CRAWL_MAX_PAGES, CRAWL_MAX_PAGES)
+    max_depth = int_option(options.get('maxDepth'), CRAWL_MAX_DEPTH, CRAWL_MAX_DEPTH, minimum=0)
+    deadline = Deadline.from_options(options)
+    sniff_dimensions = bool(options.get('sniffDimensions'))
+    page_options = {key: value for key, value in options.items() if key not in ('crawl', 'incremental')}
+    scheduler = FairProbeScheduler(get_session(), options.get('maxWorkers'), options.get('maxPerHost'))
+    registry = CrawlImageRegistry()
+    
+    def crawl_page(page_url):
+        pool = CrawlProbePool(scheduler, registry, sniff_dimensions, deadline)
+        return collect_extraction(page_url, page_options, pool, collect_links=True)
+    
+    # Frontier of (order, url, depth); seen holds normalized URLs ever queued
+    frontier = deque([(0, start_url, 0)])
+    seen = {canonical_url(start_url)}
+    pages = []
+    running = {}
+    try:
+        with ThreadPoolExecutor(max_workers=CRAWL_MAX_CONCURRENT_PAGES, thread_name_prefix='crawl-page') as executor:
+            while frontier or running:
+                while (frontier and len(running) < CRAWL_MAX_CONCURRENT_PAGES
+                       and len(pages) + len(running) < max_pages and not deadline.expired()):
+                    order, page_url, depth = frontier.popleft()
+                    print(f"Crawling page {len(pages) + len(running) + 1}/{max_pages} (depth {depth}): {page_url}")
+                    running[executor.submit(crawl_page, page_url)] = (order, page_url, depth)
+                if not running:
+                    break
+                
+                # Pages stop on their own at the deadline, so waiting needs no timeout
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    order, page_url, depth = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error crawling {page_url}: {str(e)}")
+                        pages.append((order, {'url': page_url, 'depth': depth, 'success': False, 'error': str(e)}, None))
+                        continue
+                    pages.append((order, build_crawl_page(page_url, depth, result), result))
+                    
+                    if depth >= max_depth:
+                        continue
+                    for link in result['links']:
+                        key = canonical_url(link)
+                        if key in seen or not is_crawlable_link(link, start_url):
+                            continue
+                        seen.add(key)
+                        frontier.append((len(seen) - 1, link, depth + 1))
+    finally:
+        scheduler.shutdown()
+    
+    pages.sort(key=lambda page: page[0])
+    
+    # The site's images, each counted once
+    image_urls = []
+    images = {}
+    for _, _, result in pages:
+        if result is None:
+            continue
+        for img_url in result['imageUrls']:
+            if img_url not in images:
+                images[img_url] = None
+                image_urls.append(img_url)
+        for img_info in result['imageData']:
+            images[img_info['url']] = img_info
+    image_data = [img_info for img_info in images.values() if img_info is not None]
+    image_data.sort(key=lambda x: x['size_bytes'], reverse=True)
+    
+    crawled = [page for _, page, _ in pages if page['success']]
+    valid_images = [img for img in image_data if img.get('success', False)]
+    timed_out = deadline.expired() or any(page['timedOut'] for page in crawled)
+    stats = {
+        'pagesCrawled': len(crawled),
+        'pagesFailed': len(pages) - len(crawled),
+        'frontierRemaining': len(frontier),
+        'maxDepthReached': max((page['depth'] for page in crawled), default=0),
+        'total': len(image_data),
+        'valid': len(valid_images),
+        'totalBytes': sum(img['size_bytes'] for img in valid_images),
+        'duplicateProbesAvoided': registry.duplicates,
+        'pendingCount': len(image_urls) - len(image_data),
+        'timedOut': timed_out,
+        'partial': timed_out or any(page['partial'] for page in crawled),
+        'elapsedMs': round((time.monotonic() - started) * 1000),
+    }
+    return {'pages': [page for _, page, _ in pages], 'imageUrls': image_urls, 'imageData': image_data, 'stats': stats}
+
+def build_crawl_page(page_url, depth, result):
+    """Per-page entry of a crawl: its image URLs and their combined weight"""
+    stats = result['stats']
+    valid_images = [img for img in result['imageData'] if img.get('success', False)]
+    return {
+        'url': page_url,
+        'depth': depth,
+        'success': True,
+        'imageUrls': result['imageUrls'],
+        'imageCount': len(result['imageUrls']),
+        'valid': len(valid_images),
+        'totalBytes': sum(img['size_bytes'] for img in valid_images),
+        'totalSize': format_file_size(sum(img['size_bytes'] for img in valid_images)),
+        'pageBytes': stats['pageBytes'],
+        'links': len(result['links']),
+        'timedOut': stats['timedOut'],
+        'partial': stats['partial'],
+    }
+
+def is_crawlable_link(link_url, start_url):
+    """Same-domain (is_same_domain_url rules) links that can lead to HTML pages"""
+    if not is_same_domain_url(link_url, start_url):
+        return False
+    path = urlparse(link_url).path.lower()
+    filename = path.rsplit('/', 1)[-1]
+    if '.' in filename and filename.rsplit('.', 1)[-1] in CRAWL_SKIP_EXTENSIONS:
+        return False
+    return True
+
+def collect_batch_extraction(site_urls, options=None):
+    """Extract images from many sites at once, returning (per-site results, combined stats).
+    
+    Sites are fetched and parsed concurrently and all their probes share one
+    FairProbeScheduler, so the wall time follows the slowest site rather than the
+    sum. The deadline_ms option is one budget for the whole batch.
+    """
+    if options is None:
+        options = {}
+    
+    started = time.monotonic()
+    deadline = Deadline.from_options(options)
+    sniff_dimensions = bool(options.get('sniffDimensions'))
+    scheduler = FairProbeScheduler(get_session(), options.get('maxWorkers'), options.get('maxPerHost'))
+    
+    try:
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_CONCURRENT_SITES, len(site_urls)),
+                                thread_name_prefix='batch-site') as executor:
+            sites = list(executor.map(
+                lambda site_url: extract_site(site_url, options, ScheduledProbePool(scheduler, sniff_dimensions, deadline)),
+                site_urls))
+    finally:
+        scheduler.shutdown()
+    
+    return sites, build_batch_stats(sites, time.monotonic() - started)
+
+def extract_site(site_url, options, pool):
+    """Extract one site of a batch or sitemap run, returning its result entry (errors included)"""
+    try:
+        result = collect_extraction(site_url, options, pool)
+    except Exception as e:
+        print(f"Error extracting images from {site_url}: {str(e)}")
+        return {'url': site_url, 'success': False, 'error': str(e)}
+    stats = result['stats']
+    site = {
+        'url': site_url,
+        'success': True,
+        'partial': stats['partial'],
+        'timedOut': stats['timedOut'],
+        'pendingCount': stats['pendingCount'],
+        'imageUrls': result['imageUrls'],
+        'imageData': result['imageData'],
+        'urlVariants': result['urlVariants'],
+        'stats': stats
+    }
+    if 'changes' in result:
+        site['changes'] = result['changes']
+    return site
+
+def build_batch_stats(sites, elapsed):
+    """Combine the per-site stats of a batch extraction"""
+    extracted = [site for site in sites if site['success']]
+    return {
+        'sites': len(sites),
+        'succeeded': len(extracted),
+        'failed': len(sites) - len(extracted),
+        'total': sum(site['stats']['total'] for site in extracted),
+        'valid': sum(site['stats']['valid'] for site in extracted),
+        'totalBytes': sum(img['size_bytes'] for site in extracted for img in site['imageData'] if img['success']),
+        'pageBytes': sum(site['stats']['pageBytes'] for site in extracted),
+        'pendingCount': sum(site['stats']['pendingCount'] for site in extracted),
+        'duplicateProbesAvoided': sum(site['stats']['duplicateProbesAvoided'] for site in extracted),
+        'timedOut': any(site['stats']['timedOut'] for site in extracted),
+        'partial': any(site['stats']['partial'] for site in extracted),
+        'elapsedMs': round(elapsed * 1000),
+    }
+
+def build_extraction_stats(image_data):
+    """Build the stats block of an extraction response"""
+    # Count successful requests (like network_capture.py only shows successful ones)
+    valid_images = [img for img in image_data if img.get('success', False)]
+    return {
+        'total': len(image_data),
+        'valid': len(valid_images),
+        'sameDomain': len(image_data),
+        'filtered': 0  # Already filtered by domain
+    }
+
+def format_stream_event(event, stream_format):
+    """Serialize an extraction event as an NDJSON line or a Server-Sent Event"""
+    payload = json.dumps(event)
+    if stream_format == 'sse':
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + '\n'
+
+def stream_extraction(url, options, stream_format):
+    """Streaming response body for /api/extract-images"""
+    try:
+        for event in iter_extraction_events(url, options):
+            yield format_stream_event(event, stream_format)
+    except Exception as e:
+        print(f"Error extracting images: {str(e)}")
+        yield format_stream_event({'event': 'error', 'success': False, 'error': str(e)}, stream_format)
+
+def iter_sitemap_entries(sitemap_url, session, deadline=None, max_files=SITEMAP_MAX_FILES, max_depth=SITEMAP_MAX_DEPTH,
+                         max_urls=SITEMAP_MAX_URLS):
+    """Read a sitemap or sitemap index, yielding ('url', loc) for every page and
+    ('sitemap', summary) after each sitemap file.
+    
+    Each file is read to the end into a list of page locations before any is
+    yielded, so a consumer extracting pages at its own pace never keeps a download
+    open (and exposed to server idle timeouts). Reading stops once max_urls page
+    locations have been collected over the whole run. Nested sitemaps are followed
+    breadth-first up to max_depth levels and max_files files. A file that fails is
+    reported in its summary and skipped.
+    """
+    pending = deque([(sitemap_url, 0)])
+    queued = {canonical_url(sitemap_url)}
+    files = 0
+    collected = 0
+    while pending and files < max_files and collected < max_urls:
+        if deadline is not None and deadline.expired():
+            return
+        url, depth = pending.popleft()
+        files += 1
+        summary = {'url': url, 'depth': depth, 'urls': 0, 'sitemaps': 0, 'bytes': 0, 'truncated': False, 'error': None}
+        print(f"Reading sitemap: {url}")
+        locs = []
+        try:
+            for kind, loc in parse_sitemap(url, session, summary, deadline):
+                if kind == 'sitemap':
+                    summary['sitemaps'] += 1
+                    key = canonical_url(loc)
+                    if depth < max_depth and key not in queued and len(queued) < max_files:
+                        queued.add(key)
+                        pending.append((loc, depth + 1))
+                else:
+                    summary['urls'] += 1
+                    locs.append(loc)
+                    collected += 1
+                    if collected >= max_urls:
+                        print(f"Sitemap run reached {max_urls} page URLs, the rest is skipped")
+                        summary['truncated'] = True
+                        break
+        except (requests.exceptions.RequestException, ElementTree.ParseError, zlib.error) as e:
+            print(f"Error reading sitemap {url}: {str(e)}")
+            summary['error'] = str(e)
+        for loc in locs:
+            yield 'url', loc
+        yield 'sitemap', summary
+
+def parse_sitemap(url, session, summary, deadline=None):
+    """Yield ('url', loc) and ('sitemap', loc) entries of one sitemap file while it downloads.
+    
+    Gzipped files are inflated on the fly, at most SITEMAP_MAX_BYTES are parsed, and
+    each <url>/<sitemap> element is dropped once read, so memory stays flat however
+    large the file is. summary gets the bytes read and whether the cap was hit.
+    """
+    response = session.get(url, timeout=budget_timeout(REQUEST_TIMEOUT, deadline), stream=True)
+    try:
+        response.raise_for_status()
+        parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        root = None
+        decompressor = None
+        for index, chunk in enumerate(iter_response_chunks(response)):
+            # .xml.gz files usually come without Content-Encoding, so check the magic bytes
+            if index == 0 and chunk[:2] == b'\x1f\x8b':
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            remaining = SITEMAP_MAX_BYTES - summary['bytes']
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk, remaining + 1)
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+                summary['truncated'] = True
+            summary['bytes'] += len(chunk)
+            
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    continue
+                tag = element.tag.rsplit('}', 1)[-1]
+                if tag not in ('url', 'sitemap'):
+                    continue
+                for child in element:
+                    if child.tag.rsplit('}', 1)[-1] == 'loc' and child.text and child.text.strip():
+                        yield tag, child.text.strip()
+                        break
+                # Finished entries are detached so the tree never grows
+                root.clear()
+            
+            if summary['truncated']:
+                print(f"Sitemap exceeded {SITEMAP_MAX_BYTES} bytes, the rest is skipped")
+                return
+        parser.close()
+    finally:
+        response.close()
+
+def iter_sitemap_extraction_events(sitemap_url, options=None):
+    """Extract images from every page listed in a sitemap, yielding events as they finish.
+    
+    Yields 'sitemap' events per sitemap file read, a 'page' event per extracted page
+    (the same entry as a batch site) and a final 'stats' event with running totals.
+    At most SITEMAP_MAX_CONCURRENT_PAGES pages are in flight and their probes share
+    one FairProbeScheduler. Sitemap files are read ahead of the pages (see
+    iter_sitemap_entries), holding at most maxPages locations; nothing else is kept
+    per page once its event is out.
+    """
+    if options is None:
+        options = {}
+    
+    started = time.monotonic()
+    session = get_session()
+    deadline = Deadline.from_options(options)
+    sniff_dimensions = bool(options.get('sniffDimensions'))
+    max_pages = int_option(options.get('maxPages'), SITEMAP_MAX_URLS, SITEMAP_MAX_URLS)
+    concurrency = int_option(options.get('maxConcurrentPages'), SITEMAP_MAX_CONCURRENT_PAGES,
+                             SITEMAP_MAX_CONCURRENT_PAGES)
+    scheduler = FairProbeScheduler(session, options.get('maxWorkers'), options.get('maxPerHost'))
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sitemap-page')
+    entries = iter_sitemap_entries(sitemap_url, session, deadline, max_urls=max_pages)
+    
+    stats = {'sitemaps': 0, 'sitemapErrors': 0, 'pagesListed': 0, 'pagesScheduled': 0, 'pagesSucceeded': 0,
+             'pagesFailed': 0, 'duplicatePages': 0, 'total': 0, 'valid': 0, 'totalBytes': 0,
+             'duplicateProbesAvoided': 0}
+    seen_pages = set()
+    running = set()
+    exhausted = False
+    
+    def page_event(future):
+        site = future.result()
+        if site['success']:
+            stats['pagesSucceeded'] += 1
+            stats['total'] += site['stats']['total']
+            stats['valid'] += site['stats']['valid']
+            stats['totalBytes'] += sum(img['size_bytes'] for img in site['imageData'] if img['success'])
+            stats['duplicateProbesAvoided'] += site['stats']['duplicateProbesAvoided']
+        else:
+            stats['pagesFailed'] += 1
+        return dict(site, event='page')
+    
+    try:
+        while True:
+            # Top up the window of running pages from the sitemap stream
+            while not exhausted and len(running) < concurrency and not deadline.expired():
+                entry = next(entries, None)
+                if entry is None:
+                    exhausted = True
+                    break
+                kind, value = entry
+                if kind == 'sitemap':
+                    stats['sitemaps'] += 1
+                    stats['sitemapErrors'] += 1 if value['error'] else 0
+                    yield dict(value, event='sitemap')
+                    continue
+                
+                stats['pagesListed'] += 1
+                key = canonical_url(value)
+                if key in seen_pages or not value.lower().startswith(('http://', 'https://')):
+                    stats['duplicatePages'] += 1 if key in seen_pages else 0
+                    continue
+                if stats['pagesScheduled'] >= max_pages:
+                    exhausted = True
+                    break
+                seen_pages.add(key)
+                stats['pagesScheduled'] += 1
+                pool = ScheduledProbePool(scheduler, sniff_dimensions, deadline)
+                running.add(executor.submit(extract_site, value, options, pool))
+            
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield page_event(future)
+        
+        stats['timedOut'] = deadline.expired()
+        stats['truncated'] = stats['pagesScheduled'] >= max_pages
+        stats['partial'] = stats['timedOut'] or stats['truncated']
+        stats['elapsedMs'] = round((time.monotonic() - started) * 1000)
+        yield {'event': 'stats', 'stats': stats}
+    
+    finally:
+        entries.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+        scheduler.shutdown()
+
+def stream_sitemap_extraction(sitemap_url, options, stream_format):
+    """Streaming response body for /api/extract-images/sitemap"""
+    try:
+        for event in iter_sitemap_extraction_events(sitemap_url, options):
+            yield format_stream_event(event, stream_format)
+    except Exception as e:
+        print(f"Error extracting images from sitemap: {str(e)}")
+        yield format_stream_event({'event': 'error', 'success': False, 'error': str(e)}, stream_format)
+
+class AsyncProbeEngine:
+    """asyncio scheduler for bulk probes of independent image URLs.
+    
+    Every URL becomes a task right away; at most max_per_host probes run against
+    one host and at most max_in_flight overall, so thousands of URLs spread over
+    many hosts keep all slots busy. The probes themselves are the regular
+    get_image_info_detailed calls (caches, circuit breaker and rate limits
+    included), each awaited on a worker thread since requests is blocking.
+    URLs with the same canonical_url are probed once.
+    """
+    
+    def __init__(self, session, max_in_flight=None, max_per_host=None, sniff_dimensions=False, deadline=None):
+        # Callers may lower the limits but never raise them above the configured ones
+        self.max_in_flight = int_option(max_in_flight, ANALYZE_MAX_IN_FLIGHT, ANALYZE_MAX_IN_FLIGHT)
+        self.max_per_host = int_option(max_per_host, ANALYZE_MAX_PER_HOST, ANALYZE_MAX_PER_HOST)
+        self.session = session
+        self.sniff_dimensions = sniff_dimensions
+        self.deadline = deadline
+        self.timed_out = False
+        self.error = None
+        self._loop = None
+        self._task = None
+    
+    async def run(self, urls, report):
+        """Probe all urls, calling report((index, img_info)) as each finishes and report(None) at the end"""
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='analyze')
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        host_slots = {}
+        
+        async def probe(indexes):
+            index, url = indexes[0], urls[indexes[0]]
+            try:
+                host = urlparse(url).netloc.lower()
+                if host not in host_slots:
+                    host_slots[host] = asyncio.Semaphore(self.max_per_host)
+                # Take the host slot first so one busy host never holds global slots while waiting
+                async with host_slots[host]:
+                    async with in_flight:
+                        print(f"Analyzing URL {index+1}/{len(urls)}: {url[:60]}...")
+                        img_info = await self._loop.run_in_executor(
+                            executor, get_image_info_detailed, url, self.session, self.sniff_dimensions, self.deadline)
+            except Exception as e:
+                # A URL that cannot even be scheduled (e.g. an unparsable host) still gets its row
+                img_info = create_failed_image_info(url, f'Error: {str(e)}')
+            for index in indexes:
+                variant = img_info if urls[index] == url else dict(img_info, url=urls[index])
+                report((index, format_analysis_result(variant, self.sniff_dimensions)))
+        
+        tasks = []
+        try:
+            # Spellings of one canonical URL share a probe
+            groups = {}
+            for index, url in enumerate(urls):
+                groups.setdefault(canonical_url(url), []).append(index)
+            tasks = [asyncio.ensure_future(probe(indexes)) for indexes in groups.values()]
+            
+            timeout = self.deadline.remaining() if self.deadline is not None else None
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=timeout)
+                if pending:
+                    self.timed_out = True
+                    print(f"Deadline reached: {len(pending)} URLs not analyzed")
+        except Exception as e:
+            # Raised again by iter_results on the consumer's thread
+            self.error = e
+        finally:
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            report(None)
+    
+    def iter_results(self, urls):
+        """Run the engine on its own event loop thread, yielding (index, result) in completion order"""
+        finished = queue.Queue()
+        thread = threading.Thread(target=asyncio.run, args=(self.run(urls, finished.put),),
+                                  name='analyze-loop', daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = finished.get()
+                if item is None:
+                    break
+                yield item
+            if self.error is not None:
+                raise self.error
+        finally:
+            # The consumer went away early: stop scheduling new probes
+            if thread.is_alive() and self._loop is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+def is_url_list(urls):
+    """Check that a request's urls field is a list of strings"""
+    return isinstance(urls, list) and all(isinstance(url, str) for url in urls)
+
+def format_analysis_result(img_info, sniff_dimensions=False):
+    """Convert an image info object to the /api/analyze-images result format"""
+    result = {
+        'url': img_info['url'],
+        'filename': img_info['name'],
+        'type': img_info['type'],
+        'contentType': img_info['contentType'],
+        'sizeBytes': img_info['size_bytes'],
+        'sizeKB': f"{img_info['size_bytes'] / 1024:.1f}" if img_info['size_bytes'] > 0 else "0.0",
+        'sizeMB': f"{img_info['size_bytes'] / (1024 * 1024):.3f}" if img_info['size_bytes'] > 0 else "0.000",
+        'success': img_info['success'],
+        'status': 'Success' if img_info['success'] else str(img_info.get('status', 'Failed'))
+    }
+    if sniff_dimensions:
+        result.update({
+            'width': img_info.get('width'),
+            'height': img_info.get('height'),
+            'sniffedType': img_info.get('sniffedType')
+        })
+    return result
+
+def build_analysis_summary(results):
+    """Build the summary block of an analysis response"""
+    valid_count = len([r for r in results if r['success']])
+    return {
+        'totalProcessed': len(results),
+        'validImages': valid_count,
+        'filtered': len(results) - valid_count,
+        'duplicateProbesAvoided': len(results) - len({canonical_url(r['url']) for r in results})
+    }
+
+# Background jobs
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_executor = ThreadPoolExecutor(max_workers=JOB_MAX_WORKERS, thread_name_prefix='job')
+
+def submit_job(job_type, params):
+    """Queue a background job, returning its snapshot or None if the queue is full"""
+    prune_jobs()
+    with _jobs_lock:
+        active = len([job for job in _jobs.values() if job['status'] in ('queued', 'running')])
+        if active >= JOB_MAX_QUEUE:
+            return None
+        
+        job = {
+            'jobId': uuid.uuid4().hex,
+            'type': job_type,
+            'status': 'queued',
+            'params': params,
+            'progress': {'completed': 0, 'total': None},
+            'result': {},
+            'error': None,
+            'createdAt': time.time(),
+            'startedAt': None,
+            'finishedAt': None,
+        }
+        _jobs[job['jobId']] = job
+    
+    _job_executor.submit(run_job, job)
+    return get_job(job['jobId'])
+
+def run_job(job):
+    """Run a queued job on the job executor, recording progress and partial results"""
+    with _jobs_lock:
+        job['status'] = 'running'
+        job['startedAt'] = time.time()
+    
+    params = job['params']
+    try:
+        if job['type'] == 'extract-images':
+            run_extract_job(job, params['url'], params.get('options') or {})
+        else:
+            run_analyze_job(job, params['urls'], bool(params.get('sniffDimensions')), Deadline.from_options(params))
+        status, error = 'completed', None
+    except Exception as e:
+        print(f"Job {job['jobId']} failed: {str(e)}")
+        status, error = 'failed', str(e)
+    
+    with _jobs_lock:
+        job['status'] = status
+        job['error'] = error
+        job['finishedAt'] = time.time()
+
+def run_extract_job(job, url, options):
+    with _jobs_lock:
+        job['progress']['total'] = 0
+        job['result'] = {'imageUrls': [], 'imageData': [], 'stats': None}
+    
+    for event in iter_extraction_events(url, options):
+        with _jobs_lock:
+            if event['event'] == 'discovered':
+                job['progress']['total'] += len(event['imageUrls'])
+                job['result']['imageUrls'].extend(event['imageUrls'])
+            elif event['event'] == 'image':
+                job['result']['imageData'].append(event['imageData'])
+                job['progress']['completed'] += 1
+            elif event['event'] == 'stats':
+                # Sort by size (largest first) like network_capture.py
+                job['result']['imageData'].sort(key=lambda x: x['size_bytes'], reverse=True)
+                job['result']['stats'] = event['stats']
+
+def run_analyze_job(job, urls, sniff_dimensions, deadline=None):
+    with _jobs_lock:
+        job['progress']['total'] = len(urls)
+        job['result'] = {'results': [], 'summary': None}
+    
+    engine = AsyncProbeEngine(get_session(), sniff_dimensions=sniff_dimensions, deadline=deadline)
+    indexes = []
+    for index, result in engine.iter_results(urls):
+        indexes.append(index)
+        with _jobs_lock:
+            job['result']['results'].append(result)
+            job['progress']['completed'] += 1
+    
+    with _jobs_lock:
+        # Results come in completion order; the final list follows the input order
+        order = sorted(range(len(indexes)), key=indexes.__getitem__)
+        job['result']['results'] = [job['result']['results'][i] for i in order]
+        job['result']['summary'] = build_analysis_summary(job['result']['results'])
+        job['result']['pendingCount'] = len(urls) - len(job['result']['results'])
+        job['result']['timedOut'] = engine.timed_out
+
+def get_job(job_id):
+    """Return a JSON-safe snapshot of a job, or None if unknown or expired"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        result = {key: list(value) if isinstance(value, list) else value for key, value in job['result'].items()}
+        return {
+            'jobId': job['jobId'],
+            'type': job['type'],
+            'status': job['status'],
+            'progress': dict(job['progress']),
+            'result': result,
+            'error': job['error'],
+            'createdAt': datetime.fromtimestamp(job['createdAt']).isoformat(),
+            'startedAt': datetime.fromtimestamp(job['startedAt']).isoformat() if job['startedAt'] else None,
+            'finishedAt': datetime.fromtimestamp(job['finishedAt']).isoformat() if job['finishedAt'] else None,
+        }
+
+def prune_jobs():
+    """Drop finished jobs older than the retention window"""
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _jobs_lock:
+        for job_id in [job_id for job_id, job in _jobs.items() if job['finishedAt'] and job['finishedAt'] < cutoff]:
+            del _jobs[job_id]
 
 # API Routes
 
@@ -529,6 +3411,24 @@ def health_check():
         'features': 'network_capture_compatible'
     })
 
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        'pool': get_pool_stats(),
+        'probeCache': PROBE_CACHE.get_stats(),
+        'probeStrategy': PROBE_STRATEGY.get_stats(),
+        'negativeCache': NEGATIVE_CACHE.get_stats(),
+        'circuits': HOST_CIRCUITS.get_stats(),
+        'hostLatency': HOST_LATENCY.get_stats(),
+        'rateLimiter': HOST_RATE_LIMITER.get_stats(),
+        'singleflight': {'extractions': EXTRACTION_FLIGHTS.get_stats(), 'probes': PROBE_FLIGHTS.get_stats()},
+        'cssCache': extract_css_images_cached.cache_info()._asdict(),
+        'stylesheetCache': STYLESHEET_CACHE.get_stats(),
+        'scanHistory': SCAN_HISTORY.get_stats(),
+        'persistentCache': PERSISTENT_CACHE.get_stats() if PERSISTENT_CACHE is not None else None
+    })
+
 @app.route('/api/extract-images', methods=['POST'])
 def extract_images():
     try:
@@ -544,28 +3444,131 @@ def extract_images():
         
         print(f"Starting image extraction for: {url}")
         
+        # Crawl mode (not streamed): follow same-domain links and report the weight of every page
+        if options.get('crawl'):
+            result = collect_crawl(url, options)
+            stats = result['stats']
+            print(f"Crawl complete: {stats['pagesCrawled']} pages, {stats['valid']} valid images")
+            return jsonify({
+                'success': True,
+                'partial': stats['partial'],
+                'timedOut': stats['timedOut'],
+                'pendingCount': stats['pendingCount'],
+                'pages': result['pages'],
+                'imageUrls': result['imageUrls'],
+                'imageData': result['imageData'],
+                'stats': stats
+            })
+        
+        # Streaming mode: NDJSON lines or Server-Sent Events as results arrive
+        stream_format = (options.get('stream') or request.args.get('stream') or '').lower()
+        if stream_format in STREAM_MIMETYPES:
+            return Response(
+                stream_with_context(stream_extraction(url, options, stream_format)),
+                mimetype=STREAM_MIMETYPES[stream_format],
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
         # Extract images using comprehensive method
-        image_data, image_urls = extract_images_from_website(url, options)
+        result = collect_extraction_shared(url, options)
+        stats = result['stats']
+        
+        print(f"Extraction complete: {stats['total']} total, {stats['valid']} valid")
+        
+        response = {
+            'success': True,
+            'partial': stats['partial'],
+            'timedOut': stats['timedOut'],
+            'pendingCount': stats['pendingCount'],
+            'imageUrls': result['imageUrls'],
+            'imageData': result['imageData'],
+            'urlVariants': result['urlVariants'],
+            'stats': stats
+        }
+        if 'changes' in result:
+            response['changes'] = result['changes']
+        return jsonify(response)
+        
+    except Exception as e:
+        print(f"Error extracting images: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/extract-images/batch', methods=['POST'])
+def extract_images_batch():
+    try:
+        data = request.get_json()
+        site_urls = data.get('urls', [])
+        options = data.get('options', {})
+        
+        if not site_urls:
+            return jsonify({
+                'success': False,
+                'error': 'URLs are required'
+            }), 400
+        
+        if not is_url_list(site_urls):
+            return jsonify({
+                'success': False,
+                'error': 'urls must be a list of URL strings'
+            }), 400
+        
+        if len(site_urls) > BATCH_MAX_SITES:
+            return jsonify({
+                'success': False,
+                'error': f'At most {BATCH_MAX_SITES} URLs per batch'
+            }), 400
         
-        # Filter valid images
-        valid_images = [img for img in image_data if img.get('success', False)]
+        print(f"Extracting images from {len(site_urls)} sites")
         
-        print(f"Extraction complete: {len(image_data)} total, {len(valid_images)} valid")
+        sites, stats = collect_batch_extraction(site_urls, options)
+        
+        print(f"Batch complete: {stats['succeeded']}/{stats['sites']} sites, {stats['valid']} valid images")
         
         return jsonify({
             'success': True,
-            'imageUrls': image_urls,
-            'imageData': image_data,
-            'stats': {
-                'total': len(image_data),
-                'valid': len(valid_images),
-                'sameDomain': len(image_data),
-                'filtered': 0  # Already filtered by domain
-            }
+            'partial': stats['partial'],
+            'timedOut': stats['timedOut'],
+            'sites': sites,
+            'stats': stats
         })
         
     except Exception as e:
-        print(f"Error extracting images: {str(e)}")
+        print(f"Error in batch extraction: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/extract-images/sitemap', methods=['POST'])
+def extract_images_sitemap():
+    try:
+        data = request.get_json()
+        sitemap_url = data.get('url')
+        options = data.get('options', {})
+        
+        if not sitemap_url:
+            return jsonify({
+                'success': False,
+                'error': 'Sitemap URL is required'
+            }), 400
+        
+        print(f"Starting sitemap extraction for: {sitemap_url}")
+        
+        # Always streamed (NDJSON unless SSE is asked for) so results never pile up in memory
+        stream_format = (options.get('stream') or request.args.get('stream') or '').lower()
+        if stream_format not in STREAM_MIMETYPES:
+            stream_format = 'ndjson'
+        return Response(
+            stream_with_context(stream_sitemap_extraction(sitemap_url, options, stream_format)),
+            mimetype=STREAM_MIMETYPES[stream_format],
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except Exception as e:
+        print(f"Error in sitemap extraction: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -596,17 +3599,17 @@ def analyze_images():
                     'status': 'Success' if img['success'] else str(img.get('status', 'Failed')),
                     'locationInfo': None
                 })
-            
-            valid_count = len([r for r in results if r['success']])
+                if 'sniffedType' in img:
+                    results[-1].update({
+                        'width': img.get('width'),
+                        'height': img.get('height'),
+                        'sniffedType': img['sniffedType']
+                    })
             
             return jsonify({
                 'success': True,
                 'results': results,
-                'summary': {
-                    'totalProcessed': len(results),
-                    'validImages': valid_count,
-                    'filtered': len(results) - valid_count
-                }
+                'summary': build_analysis_summary(results)
             })
         
         # For direct URL analysis (Image URLs Analysis mode)
@@ -618,39 +3621,27 @@ def analyze_images():
                 'error': 'URLs or imageData required'
             }), 400
         
-        print(f"Analyzing {len(urls)} image URLs directly")
+        if not is_url_list(urls):
+            return jsonify({
+                'success': False,
+                'error': 'urls must be a list of URL strings'
+            }), 400
         
-        session = get_session()
-        results = []
-        
-        for i, url in enumerate(urls):
-            print(f"Analyzing URL {i+1}/{len(urls)}: {url[:60]}...")
-            img_info = get_image_info_detailed(url, session)
-            results.append({
-                'url': img_info['url'],
-                'filename': img_info['name'],
-                'type': img_info['type'],
-                'contentType': img_info['contentType'],
-                'sizeBytes': img_info['size_bytes'],
-                'sizeKB': f"{img_info['size_bytes'] / 1024:.1f}" if img_info['size_bytes'] > 0 else "0.0",
-                'sizeMB': f"{img_info['size_bytes'] / (1024 * 1024):.3f}" if img_info['size_bytes'] > 0 else "0.000",
-                'success': img_info['success'],
-                'status': 'Success' if img_info['success'] else str(img_info.get('status', 'Failed'))
-            })
-            
-            # Small delay to avoid overwhelming servers
-            time.sleep(0.1)
+        print(f"Analyzing {len(urls)} image URLs directly")
         
-        valid_count = len([r for r in results if r['success']])
+        deadline = Deadline.from_options(data)
+        engine = AsyncProbeEngine(get_session(), data.get('maxInFlight'), data.get('maxPerHost'),
+                                  bool(data.get('sniffDimensions')), deadline)
+        # Results arrive in completion order; the response follows the input order
+        finished = sorted(engine.iter_results(urls), key=lambda item: item[0])
+        results = [result for _, result in finished]
         
         return jsonify({
             'success': True,
+            'timedOut': engine.timed_out,
+            'pendingCount': len(urls) - len(results),
             'results': results,
-            'summary': {
-                'totalProcessed': len(results),
-                'validImages': valid_count,
-                'filtered': len(results) - valid_count
-            }
+            'summary': build_analysis_summary(results)
         })
         
     except Exception as e:
@@ -660,6 +3651,75 @@ def analyze_images():
             'error': str(e)
         }), 500
 
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    try:
+        data = request.get_json()
+        job_type = data.get('type', 'extract-images')
+        
+        if job_type == 'extract-images':
+            if not data.get('url'):
+                return jsonify({
+                    'success': False,
+                    'error': 'URL is required'
+                }), 400
+            params = {'url': data['url'], 'options': data.get('options', {})}
+        elif job_type == 'analyze-images':
+            if not data.get('urls'):
+                return jsonify({
+                    'success': False,
+                    'error': 'URLs required'
+                }), 400
+            if not is_url_list(data['urls']):
+                return jsonify({
+                    'success': False,
+                    'error': 'urls must be a list of URL strings'
+                }), 400
+            params = {
+                'urls': data['urls'],
+                'sniffDimensions': data.get('sniffDimensions', False),
+                'deadline_ms': data.get('deadline_ms')
+            }
+        else:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown job type: {job_type}'
+            }), 400
+        
+        job = submit_job(job_type, params)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Job queue is full, try again later'
+            }), 503
+        
+        print(f"Queued {job_type} job {job['jobId']}")
+        
+        return jsonify({
+            'success': True,
+            'jobId': job['jobId'],
+            'status': job['status']
+        }), 202
+        
+    except Exception as e:
+        print(f"Error creating job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    prune_jobs()
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify(dict(job, success=True))
+
 if __name__ == '__main__':
     print("Python Image Analysis Server starting...")
     print("Using enhanced requests-only method (no WebDriver required)")
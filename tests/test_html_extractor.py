@@ -0,0 +1,150 @@
+"""Parity tests: the single-pass extract_images_from_html against the BeautifulSoup extractor it replaced"""
+import os
+import random
+import sys
+
+import pytest
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import (
+    canonical_url, extract_css_images, extract_images_from_html, is_valid_image_url,
+    make_absolute_url, parse_srcset,
+)
+
+BASE_URL = 'https://example.com/blog/post.html'
+
+
+def extract_images_from_html_soup(html_content, base_url):
+    """The BeautifulSoup extractor as it was before the single-pass parser (the parity reference)"""
+    image_urls = set()
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    for img in soup.find_all('img'):
+        src = img.get('src')
+        if src:
+            full_url = make_absolute_url(src, base_url)
+            if is_valid_image_url(full_url):
+                image_urls.add(full_url)
+
+        for attr in ['data-src', 'data-lazy-src', 'data-original', 'data-srcset']:
+            data_src = img.get(attr)
+            if data_src:
+                if 'srcset' in attr:
+                    for url in parse_srcset(data_src):
+                        full_url = make_absolute_url(url, base_url)
+                        if is_valid_image_url(full_url):
+                            image_urls.add(full_url)
+                else:
+                    full_url = make_absolute_url(data_src, base_url)
+                    if is_valid_image_url(full_url):
+                        image_urls.add(full_url)
+
+    for picture in soup.find_all('picture'):
+        for source in picture.find_all('source'):
+            srcset = source.get('srcset')
+            if srcset:
+                for url in parse_srcset(srcset):
+                    full_url = make_absolute_url(url, base_url)
+                    if is_valid_image_url(full_url):
+                        image_urls.add(full_url)
+
+    for style in soup.find_all('style'):
+        if style.string:
+            image_urls.update(extract_css_images(style.string, base_url))
+
+    for element in soup.find_all(attrs={'style': True}):
+        image_urls.update(extract_css_images(element.get('style', ''), base_url))
+
+    for selector in ['.image', '.img', '.photo', '.picture', '[data-bg]', '[data-background]']:
+        for element in soup.select(selector):
+            for attr in element.attrs:
+                if 'src' in attr or 'url' in attr or 'image' in attr:
+                    value = element.get(attr)
+                    if value and isinstance(value, str):
+                        full_url = make_absolute_url(value, base_url)
+                        if is_valid_image_url(full_url):
+                            image_urls.add(full_url)
+
+    return list(image_urls)
+
+
+def canonical_set(urls):
+    # The parser keeps one spelling per canonical URL, the reference keeps them all
+    return {canonical_url(url) for url in urls}
+
+
+def assert_parity(html_content, base_url=BASE_URL):
+    expected = canonical_set(extract_images_from_html_soup(html_content, base_url))
+    assert canonical_set(extract_images_from_html(html_content, base_url)) == expected
+    return expected
+
+
+EDGE_CASES = {
+    'img_src': '<img src="/a.png"><img src="b.jpg"><img src="">',
+    'lazy_attributes': '<img data-src="/lazy.png" data-lazy-src="/l2.png" data-original="/orig.png">',
+    'data_srcset': '<img data-srcset="/s1.png 1x, /s2.png 2x">',
+    'picture_sources': '<picture><source srcset="/p1.webp 1x, /p2.webp 2x"><img src="/p.png"></picture>',
+    'source_outside_picture': '<video><source srcset="/ignored.png"></video><source srcset="/also-ignored.png">',
+    'nested_picture': '<picture><div><picture></picture><source srcset="/nested.png"></div></picture>',
+    'stray_end_tags': '</picture><picture></div></span><source srcset="/after-stray.png"></picture>',
+    'unclosed_picture_sibling': '<div><picture></div><source srcset="/outside.png">',
+    'void_elements': '<picture><img src="/v.png"><br><source srcset="/v2.png"></picture>',
+    'self_closing': '<picture/><source srcset="/self-closed.png"><img src="/x.png"/>',
+    'style_block': '<style>.hero { background: url("/hero.png") } .x { content: url(/c.png) }</style>',
+    'style_block_comment': '<style>/* url(/commented.png) */ .a { background-image: url(/kept.png) }</style>',
+    'inline_style': '<div style="background-image: url(\'/inline.png\')"></div>',
+    'container_classes': '<div class="photo" data-url="/photo.png" data-image="/photo2.png" data-src="/p3.png"></div>',
+    'container_data_bg': '<span data-bg="/bg.png"></span><span data-background="/bg2.png"></span>',
+    'repeated_attributes': '<img src="/first.png" src="/last.png">',
+    'valueless_attributes': '<img src data-src="/valueless.png"><div class="image" data-src></div>',
+    'uppercase_tags': '<IMG SRC="/upper.png"><PICTURE><SOURCE SRCSET="/upper.webp"></PICTURE>',
+    'data_urls': '<img src="data:image/png;base64,iVBORw0KGgo="><img src="data:text/plain,x">',
+    'invalid_schemes': '<img src="javascript:alert(1)"><img src="blob:https://x/1"><img src="about:blank">',
+    'protocol_relative': '<img src="//cdn.example.com/a.png">',
+    'entities': '<img src="/a.png?x=1&amp;y=2"><div style="background:url(/e&#46;png)"></div>',
+    'url_variants': '<img src="/v.png"><img src="/v.png#f"><img src="/%76.png"><img src="http://example.com/v.png">',
+}
+
+
+@pytest.mark.parametrize('html_content', EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_edge_case_parity(html_content):
+    assert_parity(html_content)
+
+
+def test_edge_cases_find_images():
+    # Guards against both extractors agreeing on nothing
+    assert assert_parity(EDGE_CASES['picture_sources']) == canonical_set([
+        'https://example.com/p1.webp', 'https://example.com/p2.webp', 'https://example.com/p.png',
+    ])
+    assert assert_parity(EDGE_CASES['source_outside_picture']) == set()
+
+
+def generate_page(rng):
+    """A random page mixing the constructs the extractors care about, often malformed"""
+    urls = ['/a.png', 'b.jpg', '../c.gif', '//cdn.example.com/d.webp', '/e.svg?v=1', 'data:image/gif;base64,R0lG',
+            'javascript:void(0)', '', '/f.png#top', 'https://example.com:443/g.png', '/%68.png']
+    snippets = [
+        lambda: f'<img src="{rng.choice(urls)}">',
+        lambda: f'<img data-src="{rng.choice(urls)}" data-srcset="{rng.choice(urls)} 1x, {rng.choice(urls)} 2x">',
+        lambda: f'<source srcset="{rng.choice(urls)}">',
+        lambda: '<picture>',
+        lambda: '</picture>',
+        lambda: f'<{rng.choice(["div", "span", "p", "section"])} class="{rng.choice(["photo", "img", "card", "image x"])}"'
+                f' data-image="{rng.choice(urls)}">',
+        lambda: f'</{rng.choice(["div", "span", "p", "section", "a"])}>',
+        lambda: f'<div style="background: url({rng.choice(urls)})">',
+        lambda: f'<style>.c{rng.randrange(9)} {{ background-image: url("{rng.choice(urls)}") }}</style>',
+        lambda: f'<span data-bg="{rng.choice(urls)}"></span>',
+        lambda: '<br>',
+        lambda: 'text',
+    ]
+    return ''.join(rng.choice(snippets)() for _ in range(rng.randrange(1, 40)))
+
+
+def test_generated_page_parity():
+    rng = random.Random(1234)
+    for _ in range(500):
+        assert_parity(generate_page(rng))
@@ -0,0 +1,108 @@
+"""Tests for the magic-byte and header parsers behind sniffDimensions"""
+import os
+import struct
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import SNIFF_MAX_BYTES, SNIFFED_MIME_TYPES, sniff_data_url, sniff_image_header
+
+
+def png(width, height):
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + ihdr +
+            struct.pack('>I', zlib.crc32(b'IHDR' + ihdr)) + b'\0' * 16)
+
+
+def jpeg(width, height):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\0\x01\x01\0\0\x01\0\x01\0\0'
+    sof = b'\xff\xc0' + struct.pack('>HBHH', 17, 8, height, width) + b'\x03' + b'\0' * 9
+    return b'\xff\xd8' + app0 + sof + b'\xff\xd9'
+
+
+def webp_vp8x(width, height):
+    chunk = b'\0' * 4 + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+    return b'RIFF' + struct.pack('<I', 4 + 8 + len(chunk)) + b'WEBP' + b'VP8X' + struct.pack('<I', len(chunk)) + chunk
+
+
+def webp_vp8l(width, height):
+    bits = (width - 1) | ((height - 1) << 14)
+    chunk = b'\x2f' + struct.pack('<I', bits) + b'\0' * 8
+    return b'RIFF' + struct.pack('<I', 4 + 8 + len(chunk)) + b'WEBP' + b'VP8L' + struct.pack('<I', len(chunk)) + chunk
+
+
+def avif(width, height):
+    ftyp = struct.pack('>I', 20) + b'ftyp' + b'avif' + b'\0\0\0\0' + b'mif1'
+    ispe = struct.pack('>I', 20) + b'ispe' + b'\0\0\0\0' + struct.pack('>II', width, height)
+    return ftyp + ispe
+
+
+IMAGES = {
+    'png': (png(640, 480), ('png', 640, 480)),
+    'gif': (b'GIF89a' + struct.pack('<HH', 32, 16) + b'\0' * 8, ('gif', 32, 16)),
+    'jpeg': (jpeg(1920, 1080), ('jpg', 1920, 1080)),
+    'webp_vp8x': (webp_vp8x(300, 200), ('webp', 300, 200)),
+    'webp_vp8l': (webp_vp8l(17, 9), ('webp', 17, 9)),
+    'avif': (avif(800, 600), ('avif', 800, 600)),
+    'bmp': (b'BM' + b'\0' * 16 + struct.pack('<ii', 120, -60) + b'\0' * 8, ('bmp', 120, 60)),
+    'ico': (b'\x00\x00\x01\x00\x01\x00' + bytes([0, 48]) + b'\0' * 8, ('ico', 256, 48)),
+    'svg': (b'<svg xmlns="http://www.w3.org/2000/svg" width="24" height="16"></svg>', ('svg', 24, 16)),
+    'svg_viewbox': (b'<svg viewBox="0 0 100 50"><path/></svg>', ('svg', 100, 50)),
+    'svg_relative_size': (b'<svg width="100%" height="100%"></svg>', ('svg', None, None)),
+    'svg_prolog': (b'\xef\xbb\xbf<?xml version="1.0"?>\n<!-- icon -->\n'
+                   b'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n'
+                   b'<svg width="10px" height="20"/>', ('svg', 10, 20)),
+}
+
+
+@pytest.mark.parametrize('data, expected', IMAGES.values(), ids=IMAGES.keys())
+def test_sniff_formats(data, expected):
+    assert sniff_image_header(data) == expected
+
+
+def test_sniffed_types_have_real_mime_types():
+    assert SNIFFED_MIME_TYPES['jpg'] == 'image/jpeg'
+    assert SNIFFED_MIME_TYPES['svg'] == 'image/svg+xml'
+    for data, (sniffed_type, _, _) in IMAGES.values():
+        assert sniffed_type in SNIFFED_MIME_TYPES
+
+
+NOT_SVG = {
+    'html_inline_icon': (b'<!DOCTYPE html><html><head><title>Not found</title></head><body>'
+                         b'<svg width="24" height="24"><path d="M0 0"/></svg></body></html>'),
+    'html_without_doctype': b'<html><body><svg width="24" height="24"></svg></body></html>',
+    'svg_after_other_root': b'<?xml version="1.0"?><feed><svg width="1" height="1"/></feed>',
+    'svg_prefix_tag': b'<svgfoo width="1" height="1"></svgfoo>',
+    'plain_text': b'Not found, try again later',
+}
+
+
+@pytest.mark.parametrize('data', NOT_SVG.values(), ids=NOT_SVG.keys())
+def test_markup_that_is_not_svg(data):
+    assert sniff_image_header(data) == ('unknown', None, None)
+
+
+@pytest.mark.parametrize('data', [
+    b'short',
+    b'\x89PNG\r\n\x1a\n\0\0\0\x0dIHDR',
+    b'<?xml version="1.0" encoding="UTF-8"',
+    b'<!-- a long comment that is still',
+    b'<?xml version="1.0"?>\n<sv',
+], ids=['too_short', 'png_before_ihdr_data', 'open_xml_declaration', 'open_comment', 'cut_root_tag'])
+def test_needs_more_data(data):
+    sniffed_type, width, height = sniff_image_header(data)
+    assert width is None and height is None
+    assert sniffed_type in (None, 'png')
+
+
+def test_prolog_never_ending_gives_up():
+    data = b'<!--' + b'x' * SNIFF_MAX_BYTES
+    assert sniff_image_header(data) == ('unknown', None, None)
+
+
+def test_sniff_data_url():
+    svg = 'data:image/svg+xml,%3Csvg%20width%3D%228%22%20height%3D%229%22%3E%3C%2Fsvg%3E'
+    assert sniff_data_url(svg) == {'sniffedType': 'svg', 'width': 8, 'height': 9}